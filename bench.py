@@ -0,0 +1,347 @@
+"""
+offline benchmark of the python hot paths on synthetic inputs (see bench_gen.py)
+
+each stage is timed (throughput in units/s) and then re-run under tracemalloc for its peak python memory.
+results are compared with a saved baseline and the run fails when a stage regresses beyond the threshold
+"""
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Callable
+
+import bench_gen
+import extract_callgraph
+import get_test_methods
+import metrics
+import run_cov
+from config import LOG_DIR
+from utils import prepare_dir
+
+BENCH_BASELINE = os.path.join(LOG_DIR, "bench_baseline.json")
+
+
+@dataclass
+class StageResult:
+    name: str
+    units: int
+    unit: str
+    seconds: float
+    throughput: float
+    peak_mem_kb: int
+
+
+@dataclass
+class Stage:
+    name: str
+    unit: str
+    # builds the inputs once and returns a runner which returns the processed unit count
+    prepare: Callable[[str], Callable[[], int]]
+
+
+def cached(path: str, gen: Callable[[str], dict]) -> str:
+    """
+    inputs are keyed by their generation parameters in the file name, so large logs are only written once
+    """
+    if not os.path.exists(path):
+        gen(path)
+    return path
+
+
+def cached_call_log(work_dir: str, scale: float, seed: int) -> str:
+    n_classes = max(10, int(200 * scale))
+    target_bytes = int(20 * 1024 * 1024 * scale)
+    return cached(
+        os.path.join(work_dir, f"call_{seed}_{n_classes}_{target_bytes}.log"),
+        lambda p: bench_gen.write_call_log(
+            p, seed=seed, n_classes=n_classes, target_bytes=target_bytes
+        ),
+    )
+
+
+def prepare_call_log(scale: float, seed: int) -> Callable[[str], Callable[[], int]]:
+    def prepare(work_dir: str) -> Callable[[], int]:
+        path = cached_call_log(work_dir, scale, seed)
+
+        def run() -> int:
+            extract_callgraph.construct_method_call_mapping(path)
+            return os.path.getsize(path)
+
+        return run
+
+    return prepare
+
+
+def prepare_call_log_gz(scale: float, seed: int) -> Callable[[str], Callable[[], int]]:
+    """
+    same log as prepare_call_log, gzip compressed the way gen_callgraph writes it,
+    throughput is in uncompressed bytes so both stages compare directly
+    """
+
+    def prepare(work_dir: str) -> Callable[[], int]:
+        plain_path = cached_call_log(work_dir, scale, seed)
+        path = plain_path + ".gz"
+        if not os.path.exists(path):
+            with open(plain_path, "rb") as src, gzip.open(
+                path, "wb", compresslevel=1
+            ) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+
+        def run() -> int:
+            extract_callgraph.construct_method_call_mapping(path)
+            return os.path.getsize(plain_path)
+
+        return run
+
+    return prepare
+
+
+def traversal_runner(mapping: dict) -> Callable[[], int]:
+    uts = [
+        m
+        for m in mapping.keys()
+        if m.class_name.endswith("Test") and m.func_name.startswith("test")
+    ]
+    extract_callgraph.set_project_filter(extract_callgraph.extract_project_prefix(uts))
+
+    def run() -> int:
+        call_entries = {}
+        for ut in uts:
+            extract_callgraph.construct_ut_call_tree(ut, mapping, call_entries)
+        return sum(len(val) for val in call_entries.values())
+
+    return run
+
+
+def prepare_traverse_random(scale: float, seed: int) -> Callable[[str], Callable[[], int]]:
+    n_classes = max(10, int(60 * scale))
+
+    def prepare(work_dir: str) -> Callable[[], int]:
+        path = cached(
+            os.path.join(work_dir, f"traverse_{seed}_{n_classes}.log"),
+            lambda p: bench_gen.write_call_log(
+                p, seed=seed, n_classes=n_classes, n_test_classes=10, fanout=4
+            ),
+        )
+        return traversal_runner(extract_callgraph.construct_method_call_mapping(path))
+
+    return prepare
+
+
+def prepare_traverse_deep(scale: float, seed: int) -> Callable[[str], Callable[[], int]]:
+    depth = max(50, int(400 * scale))
+
+    def prepare(work_dir: str) -> Callable[[], int]:
+        path = cached(
+            os.path.join(work_dir, f"deep_{seed}_{depth}.log"),
+            lambda p: bench_gen.write_deep_call_log(p, seed=seed, depth=depth),
+        )
+        return traversal_runner(extract_callgraph.construct_method_call_mapping(path))
+
+    return prepare
+
+
+def prepare_jacoco(scale: float, seed: int) -> Callable[[str], Callable[[], int]]:
+    n_packages = max(2, int(20 * scale))
+
+    def prepare(work_dir: str) -> Callable[[], int]:
+        path = cached(
+            os.path.join(work_dir, f"jacoco_{seed}_{n_packages}.xml"),
+            lambda p: bench_gen.write_jacoco_report(p, seed=seed, n_packages=n_packages),
+        )
+
+        def run() -> int:
+            covered_lines = {}
+            return len(run_cov.extract_cov_report(path, covered_lines))
+
+        return run
+
+    return prepare
+
+
+def prepare_persist(scale: float, seed: int) -> Callable[[str], Callable[[], int]]:
+    n_packages = max(2, int(20 * scale))
+    n_tests = 20
+
+    def prepare(work_dir: str) -> Callable[[], int]:
+        path = cached(
+            os.path.join(work_dir, f"jacoco_{seed}_{n_packages}.xml"),
+            lambda p: bench_gen.write_jacoco_report(p, seed=seed, n_packages=n_packages),
+        )
+        cov_records = run_cov.extract_cov_report(path)
+
+        def run() -> int:
+            # persist_cov_data writes relative to the working directory
+            cwd = os.getcwd()
+            os.chdir(work_dir)
+            try:
+                for i in range(n_tests):
+                    run_cov.persist_cov_data(
+                        f"org.bench.project.BenchTest#test{i}", cov_records
+                    )
+            finally:
+                os.chdir(cwd)
+            return len(cov_records) * n_tests
+
+        return run
+
+    return prepare
+
+
+def prepare_surefire(scale: float, seed: int) -> Callable[[str], Callable[[], int]]:
+    n_files = max(10, int(2000 * scale))
+
+    def prepare(work_dir: str) -> Callable[[], int]:
+        report_dir = os.path.join(work_dir, f"surefire_{seed}_{n_files}")
+        if not os.path.exists(report_dir):
+            bench_gen.write_surefire_reports(report_dir, seed=seed, n_files=n_files)
+
+        def run() -> int:
+            get_test_methods.collect_reported_methods(report_dir)
+            return n_files
+
+        return run
+
+    return prepare
+
+
+def build_stages(scale: float, seed: int) -> list[Stage]:
+    return [
+        Stage("construct_method_call_mapping", "bytes", prepare_call_log(scale, seed)),
+        Stage(
+            "construct_method_call_mapping_gz", "bytes", prepare_call_log_gz(scale, seed)
+        ),
+        Stage("traverse_ut_call_tree", "entries", prepare_traverse_random(scale, seed)),
+        Stage("traverse_ut_call_tree_deep", "entries", prepare_traverse_deep(scale, seed)),
+        Stage("extract_cov_report", "records", prepare_jacoco(scale, seed)),
+        Stage("persist_cov_data", "records", prepare_persist(scale, seed)),
+        Stage("collect_reported_methods", "files", prepare_surefire(scale, seed)),
+    ]
+
+
+def run_stage(stage: Stage, work_dir: str, repeat: int, memory: bool) -> StageResult:
+    runner = stage.prepare(work_dir)
+    # best of `repeat` untraced runs for time, tracemalloc slows allocation heavy code down
+    best = float("inf")
+    units = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        units = runner()
+        best = min(best, time.perf_counter() - start)
+    peak = 0
+    if memory:
+        tracemalloc.start()
+        runner()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return StageResult(
+        stage.name, units, stage.unit, best, units / best if best > 0 else 0.0, peak // 1024
+    )
+
+
+def load_baseline(path: str) -> dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, results: list[StageResult]):
+    prepare_dir(os.path.dirname(path))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({res.name: asdict(res) for res in results}, f, indent=4)
+
+
+def check_regressions(
+    results: list[StageResult], baseline: dict[str, dict], threshold: float
+) -> list[str]:
+    """
+    compares throughput (not raw seconds, so baselines survive a change of --scale) and peak memory
+    """
+    failures = []
+    for res in results:
+        base = baseline.get(res.name)
+        if base is None:
+            continue
+        if res.throughput < base["throughput"] / (1 + threshold):
+            failures.append(
+                f"{res.name}: throughput {res.throughput:.0f} {res.unit}/s < baseline {base['throughput']:.0f}"
+            )
+        if base["peak_mem_kb"] > 0 and res.peak_mem_kb > base["peak_mem_kb"] * (
+            1 + threshold
+        ):
+            failures.append(
+                f"{res.name}: peak memory {res.peak_mem_kb} KB > baseline {base['peak_mem_kb']} KB"
+            )
+    return failures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline hot paths")
+    parser.add_argument(
+        "-s", "--scale", type=float, default=1.0, help="input size multiplier"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="generator seed")
+    parser.add_argument(
+        "-k", "--stage", action="append", default=[], help="only run these stages"
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="timed runs per stage")
+    parser.add_argument(
+        "-w", "--work-dir", default="", help="where generated inputs are cached"
+    )
+    parser.add_argument(
+        "--no-memory", action="store_true", help="skip the tracemalloc pass"
+    )
+    parser.add_argument("-b", "--baseline", default=BENCH_BASELINE, help="baseline file")
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="store this run as the baseline"
+    )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="allowed relative regression before failing",
+    )
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    work_dir = args.work_dir or os.path.join(tempfile.gettempdir(), "utcov_bench")
+    prepare_dir(work_dir)
+    # keep benchmark phases out of the pipeline metrics
+    metrics.METRICS_FILE = os.path.join(work_dir, "metrics.jsonl")
+
+    stages = build_stages(args.scale, args.seed)
+    if len(args.stage) > 0:
+        stages = [stage for stage in stages if stage.name in args.stage]
+
+    results = []
+    for stage in stages:
+        res = run_stage(stage, work_dir, args.repeat, not args.no_memory)
+        results.append(res)
+        print(
+            f"{res.name:32} {res.seconds:9.3f}s {res.throughput:14.0f} {res.unit}/s {res.peak_mem_kb:10d} KB peak"
+        )
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+
+    failures = check_regressions(results, load_baseline(args.baseline), args.threshold)
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if len(failures) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
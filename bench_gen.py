@@ -0,0 +1,213 @@
+"""
+seeded synthetic inputs for the benchmark suite, shaped like the real tool outputs:
+- javacg call logs (`M:caller (T)callee` lines, with some `C:` class lines)
+- jacoco.xml reports (package/class/method counters plus sourcefile lines)
+- surefire-reports directories of TEST-*.xml files
+everything is generated offline, no maven or JVM needed
+"""
+
+import os
+import random
+from xml.sax.saxutils import quoteattr
+
+CALL_TYPES = "MISOD"
+ARG_TYPES = ["int", "long", "boolean", "java.lang.String", "java.lang.Object", "byte[]"]
+METRICS = ["INSTRUCTION", "BRANCH", "LINE", "COMPLEXITY", "METHOD"]
+DEFAULT_PREFIX = "org.bench.project"
+
+
+def method_sig(class_name: str, func_name: str, arg_types: list[str]) -> str:
+    return f"{class_name}:{func_name}({','.join(arg_types)})"
+
+
+def gen_methods(
+    rng: random.Random, prefix: str, n_classes: int, methods_per_class: int
+) -> list[str]:
+    methods = []
+    for c in range(n_classes):
+        pkg = f"{prefix}.pkg{c % 17}"
+        class_name = f"{pkg}.Clazz{c}"
+        if c % 11 == 0:
+            class_name += f"$Inner{c % 3}"
+        for m in range(methods_per_class):
+            n_args = rng.randint(0, 3)
+            args = [rng.choice(ARG_TYPES) for _ in range(n_args)]
+            func_name = "<init>" if m == 0 else f"method{m}"
+            methods.append(method_sig(class_name, func_name, args))
+    return methods
+
+
+def gen_test_methods(
+    rng: random.Random, prefix: str, n_test_classes: int, tests_per_class: int
+) -> list[str]:
+    tests = []
+    for c in range(n_test_classes):
+        class_name = f"{prefix}.pkg{c % 17}.Clazz{c}Test"
+        for t in range(tests_per_class):
+            tests.append(method_sig(class_name, f"testCase{t}", []))
+    return tests
+
+
+def write_call_log(
+    path: str,
+    seed: int = 0,
+    n_classes: int = 200,
+    methods_per_class: int = 10,
+    fanout: int = 6,
+    n_test_classes: int = 20,
+    tests_per_class: int = 5,
+    external_ratio: float = 0.2,
+    prefix: str = DEFAULT_PREFIX,
+    target_bytes: int = 0,
+) -> dict[str, int]:
+    """
+    random call graph in javacg format, test methods call into project methods,
+    project methods call each other and external library methods (excluded by prefix).
+    with target_bytes > 0 the edge lines are repeated (with fresh random callees) until the file reaches that size,
+    this is how multi-GB logs are produced without holding the graph in memory
+    """
+    rng = random.Random(seed)
+    methods = gen_methods(rng, prefix, n_classes, methods_per_class)
+    externals = gen_methods(rng, "java.util", max(1, n_classes // 10), methods_per_class)
+    tests = gen_test_methods(rng, prefix, n_test_classes, tests_per_class)
+
+    lines = 0
+    size = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for c in range(n_classes):
+            line = f"C:{prefix}.pkg{c % 17}.Clazz{c} java.lang.Object\n"
+            f.write(line)
+            size += len(line)
+            lines += 1
+        while True:
+            for caller in tests + methods:
+                for _ in range(fanout):
+                    if rng.random() < external_ratio:
+                        callee = rng.choice(externals)
+                    else:
+                        callee = rng.choice(methods)
+                    line = f"M:{caller} ({rng.choice(CALL_TYPES)}){callee}\n"
+                    f.write(line)
+                    size += len(line)
+                    lines += 1
+            if size >= target_bytes:
+                break
+    return {"lines": lines, "bytes": size, "tests": len(tests), "methods": len(methods)}
+
+
+def write_deep_call_log(
+    path: str,
+    seed: int = 0,
+    depth: int = 500,
+    n_chains: int = 4,
+    cycle_every: int = 25,
+    prefix: str = DEFAULT_PREFIX,
+) -> dict[str, int]:
+    """
+    long call chains from each test, every `cycle_every` levels a back-edge to an earlier level forms a cycle
+    """
+    rng = random.Random(seed)
+    lines = 0
+    size = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for chain in range(n_chains):
+            test = method_sig(f"{prefix}.deep.Chain{chain}Test", "testDeep", [])
+            nodes = [
+                method_sig(f"{prefix}.deep.Chain{chain}Level{level}", "step", ["int"])
+                for level in range(depth)
+            ]
+            edges = [(test, nodes[0])]
+            for level in range(depth - 1):
+                edges.append((nodes[level], nodes[level + 1]))
+                if cycle_every > 0 and level > 0 and level % cycle_every == 0:
+                    edges.append((nodes[level], nodes[rng.randrange(level)]))
+            for caller, callee in edges:
+                line = f"M:{caller} (M){callee}\n"
+                f.write(line)
+                size += len(line)
+                lines += 1
+    return {"lines": lines, "bytes": size, "tests": n_chains, "methods": depth * n_chains}
+
+
+def write_jacoco_report(
+    path: str,
+    seed: int = 0,
+    n_packages: int = 20,
+    classes_per_package: int = 25,
+    methods_per_class: int = 12,
+    lines_per_method: int = 8,
+    hit_ratio: float = 0.3,
+) -> dict[str, int]:
+    rng = random.Random(seed)
+    records = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>')
+        f.write('<report name="bench">')
+        f.write('<sessioninfo id="bench" start="0" dump="0"/>')
+        for p in range(n_packages):
+            pkg = f"org/bench/project/pkg{p}"
+            f.write(f"<package name={quoteattr(pkg)}>")
+            sources = []
+            for c in range(classes_per_package):
+                source = f"Clazz{c}.java"
+                f.write(
+                    f'<class name="{pkg}/Clazz{c}" sourcefilename="{source}">'
+                )
+                line_hits = []
+                for m in range(methods_per_class):
+                    first_line = 10 + m * (lines_per_method + 2)
+                    hit = rng.random() < hit_ratio
+                    name = "&lt;init&gt;" if m == 0 else f"method{m}"
+                    f.write(f'<method name="{name}" desc="()V" line="{first_line}">')
+                    for metric in METRICS:
+                        total = lines_per_method * 3 if metric == "INSTRUCTION" else lines_per_method
+                        covered = rng.randint(1, total) if hit else 0
+                        f.write(
+                            f'<counter type="{metric}" missed="{total - covered}" covered="{covered}"/>'
+                        )
+                    f.write("</method>")
+                    records += 1
+                    for nr in range(first_line, first_line + lines_per_method):
+                        line_hits.append((nr, hit and rng.random() < 0.8))
+                f.write("</class>")
+                sources.append((source, line_hits))
+            for source, line_hits in sources:
+                f.write(f'<sourcefile name="{source}">')
+                for nr, hit in line_hits:
+                    ci = 3 if hit else 0
+                    f.write(f'<line nr="{nr}" mi="{3 - ci}" ci="{ci}" mb="0" cb="0"/>')
+                f.write("</sourcefile>")
+            f.write("</package>")
+        f.write("</report>")
+    return {"records": records, "bytes": os.path.getsize(path)}
+
+
+def write_surefire_reports(
+    report_dir: str,
+    seed: int = 0,
+    n_files: int = 2000,
+    tests_per_file: int = 8,
+    parameterized_ratio: float = 0.1,
+) -> dict[str, int]:
+    rng = random.Random(seed)
+    os.makedirs(report_dir, exist_ok=True)
+    testcases = 0
+    for i in range(n_files):
+        class_name = f"org.bench.project.pkg{i % 17}.Clazz{i}Test"
+        path = os.path.join(report_dir, f"TEST-{class_name}.xml")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            f.write(
+                f'<testsuite name="{class_name}" tests="{tests_per_file}" failures="0" errors="0" skipped="0">\n'
+            )
+            f.write("<properties/>\n")
+            for t in range(tests_per_file):
+                name = f"testCase{t}"
+                if rng.random() < parameterized_ratio:
+                    name += f"(String, int)[{rng.randint(1, 9)}]"
+                f.write(
+                    f'<testcase name={quoteattr(name)} classname="{class_name}" time="0.{rng.randint(0, 999):03d}"/>\n'
+                )
+                testcases += 1
+            f.write("</testsuite>\n")
+    return {"files": n_files, "testcases": testcases}
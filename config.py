@@ -4,11 +4,28 @@ import sys
 # PROJECT_PREFIX = "org.apache.commons.lang3"
 BASE_DIR = os.path.join(sys.path[0], "..")
 LOG_DIR = os.path.join(BASE_DIR, "logs")
-CALL_LOG = os.path.join(LOG_DIR, "test_source_call.log")
+CALL_LOG = os.path.join(LOG_DIR, "test_source_call.log.gz")
 CALL_ENTRY_PICKLE = os.path.join(LOG_DIR, "call_entries.pickle")
 CALL_ENTRY_JSON = os.path.join(LOG_DIR, "call_entries.json")
+CALL_ENTRY_TRUNCATED = os.path.join(LOG_DIR, "call_entries_truncated.json")
+# settings the cached call entries were built with, a rerun with other settings rebuilds them
+CALL_ENTRY_KEY = os.path.join(LOG_DIR, "call_entries_key.json")
 
 TARGET_DIR = os.path.join(BASE_DIR, "target")
 
 DATA_DIR = os.path.join(BASE_DIR, "data")
 TEST_METHODS_FILE = os.path.join(DATA_DIR, "test_methods.json")
+
+METRICS_FILE = os.path.join(LOG_DIR, "metrics.jsonl")
+PROFILE_DIR = os.path.join(LOG_DIR, "profile")
+UT_COV_DIR = os.path.join(BASE_DIR, "ut_cov_data")
+
+# package globs (see pkg_filter.py) selecting the classes call chains are followed into,
+# an empty include list falls back to the common prefix of the unit test classes
+INCLUDE_PATTERNS: list[str] = []
+EXCLUDE_PATTERNS: list[str] = []
+
+# per unit test traversal budgets of extract_callgraph.py, 0 means unlimited
+MAX_CALL_DEPTH = 0
+MAX_CALL_ENTRIES = 0
+MAX_CALL_SECONDS = 0.0
@@ -0,0 +1,425 @@
+"""
+long-running daemon keeping the call graph and the coverage hot
+
+loads the call mapping (extract_callgraph.py) and the per-test coverage (run_cov.py, via cov_store) once
+and answers json-lines queries over a local unix socket:
+
+    {"op": "ping"}
+    {"op": "call_chain", "test": "org.foo.BarTest#testBaz"}
+    {"op": "covering", "method": "org.foo.Bar#baz"}     (or a class "org.foo.Bar")
+    {"op": "coverage", "test": "org.foo.BarTest#testBaz"}
+    {"op": "stats"}
+
+a watcher thread polls target/*.jar and ut_cov_data and updates only the affected parts:
+- a changed jar is re-run through javacg, the edges of the classes it defines are replaced
+  and only the cached call chains visiting one of those classes are dropped
+- a changed per-test coverage file reloads the postings of that test
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import subprocess
+import threading
+import time
+import zipfile
+
+import cov_store
+import extract_callgraph
+from config import CALL_LOG, LOG_DIR, UT_COV_DIR
+from extract_callgraph import CallEnry, Method
+from gen_callgraph import JAVACG_JAR, collect_compiled_jars
+from utils import open_text
+
+logging.basicConfig(level=logging.INFO, format="[%(levelname)s] - %(asctime)s - %(message)s")
+
+DAEMON_SOCKET = os.path.join(LOG_DIR, "utcov.sock")
+DEFAULT_METRIC = "INSTRUCTION"
+# the project is walked for new jars every this many polls, known jars are stat'ed every poll
+JAR_RESCAN_POLLS = 30
+
+
+def jar_classes(jar: str) -> set[str]:
+    """
+    dotted names of the classes defined in a jar, as javacg spells them
+    """
+    with zipfile.ZipFile(jar) as zf:
+        return {
+            name[: -len(".class")].replace("/", ".")
+            for name in zf.namelist()
+            if name.endswith(".class")
+        }
+
+
+def method_key(method: Method) -> str:
+    return f"{method.class_name}#{method.func_name}"
+
+
+class CallGraphState:
+    def __init__(self):
+        self.mapping: dict[Method, list[Method]] = {}
+        self.interned: dict[Method, Method] = {}
+        self.class_callers: dict[str, set[Method]] = {}
+        self.by_name: dict[str, list[Method]] = {}
+        self.jar_classes: dict[str, set[str]] = {}
+        # unit test -> (entries, truncation reason, classes visited)
+        self.chains: dict[Method, tuple[list[CallEnry], str, set[str]]] = {}
+
+    def load(self, call_log: str):
+        if os.path.exists(call_log):
+            with open_text(call_log) as f:
+                self.add_mapping(extract_callgraph.mapping_from_lines(f, self.interned))
+        for jar in collect_compiled_jars():
+            self.jar_classes[jar] = jar_classes(jar)
+        unit_tests = [m for m in self.mapping if extract_callgraph.is_unit_test_method(m)]
+        extract_callgraph.set_project_filter(
+            extract_callgraph.extract_project_prefix(unit_tests),
+            extract_callgraph.include_patterns,
+            extract_callgraph.exclude_patterns,
+        )
+
+    def add_mapping(self, mapping: dict[Method, list[Method]]):
+        for caller, callees in mapping.items():
+            self.mapping[caller] = callees
+            self.class_callers.setdefault(caller.class_name, set()).add(caller)
+            self.by_name.setdefault(method_key(caller), []).append(caller)
+
+    def remove_classes(self, classes: set[str]):
+        for class_name in classes:
+            for caller in self.class_callers.pop(class_name, set()):
+                self.mapping.pop(caller, None)
+                callers = self.by_name.get(method_key(caller), [])
+                if caller in callers:
+                    callers.remove(caller)
+
+    def invalidate(self, classes: set[str]):
+        """
+        a call chain only changes if it visits a caller whose edges changed
+        """
+        stale = [ut for ut, (_, _, visited) in self.chains.items() if visited & classes]
+        for ut in stale:
+            del self.chains[ut]
+        return len(stale)
+
+    def update_jar(self, jar: str, lock: threading.RLock) -> bool:
+        """
+        javacg and the parsing run outside `lock`, queries only wait for the swap of the edges.
+        only the watcher thread touches `interned` and `jar_classes`
+        """
+        # drop the interned methods of the jar's old classes, the live mapping keeps its own references
+        # until the swap, so objects of replaced or deleted classes are freed afterwards
+        old_classes = self.jar_classes.get(jar, set())
+        for method in [m for m in self.interned if m.class_name in old_classes]:
+            del self.interned[method]
+        proc = subprocess.Popen(
+            ["java", "-jar", JAVACG_JAR, jar],
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+        )
+        assert proc.stdout is not None
+        mapping = extract_callgraph.mapping_from_lines(proc.stdout, self.interned)
+        if proc.wait() != 0:
+            logging.error(f"javacg failed on {jar}, keeping its previous edges")
+            return False
+        new_classes = jar_classes(jar)
+        changed = old_classes | new_classes
+        with lock:
+            self.remove_classes(changed)
+            self.add_mapping(mapping)
+            dropped = self.invalidate(changed)
+        self.jar_classes[jar] = new_classes
+        logging.info(
+            f"reloaded {jar}: {len(mapping)} callers, {dropped} cached call chains dropped"
+        )
+        return True
+
+    def resolve(self, name: str) -> Method | None:
+        """
+        `org.foo.BarTest#testBaz`, overloads resolve to the first one
+        """
+        methods = self.by_name.get(name)
+        if not methods:
+            return None
+        return methods[0]
+
+    def call_chain(self, ut: Method) -> tuple[list[CallEnry], str]:
+        cached = self.chains.get(ut)
+        if cached is not None:
+            return cached[0], cached[1]
+        entries: list[CallEnry] = []
+        truncated = extract_callgraph.traverse_ut_call_tree(
+            ut, self.mapping, 1, entries, budget=extract_callgraph.traversal_budget
+        )
+        visited = {ut.class_name} | {entry.callee.class_name for entry in entries}
+        self.chains[ut] = (entries, truncated, visited)
+        return entries, truncated
+
+
+class CoverageState:
+    def __init__(self, store_dir: str, metric: str):
+        self.store_dir = store_dir
+        self.metric = metric
+        # "org.foo.Bar#baz" -> {test: covered}
+        self.postings: dict[str, dict[str, int]] = {}
+        self.tests: dict[str, set[str]] = {}
+        self.mtimes: dict[str, int] = {}
+
+    def load_test(self, test: str):
+        self.remove_test(test)
+        covered: dict[str, int] = {}
+        for rec in cov_store.load(test, self.store_dir):
+            cov = rec["cov"].get(self.metric)
+            if cov is None or cov["covered"] == 0:
+                continue
+            loc = rec["loc"]
+            name = f"{loc['classes'].replace('/', '.')}#{loc['method']}"
+            # overloads share a location
+            covered[name] = covered.get(name, 0) + cov["covered"]
+        for name, count in covered.items():
+            self.postings.setdefault(name, {})[test] = count
+        self.tests[test] = set(covered)
+
+    def remove_test(self, test: str):
+        for name in self.tests.pop(test, set()):
+            posting = self.postings.get(name)
+            if posting is not None:
+                posting.pop(test, None)
+
+    def scan(self) -> list[str]:
+        """
+        tests whose per-test file changed (or disappeared) since the last scan
+        """
+        changed = []
+        seen = set()
+        if os.path.exists(self.store_dir):
+            for entry in os.scandir(self.store_dir):
+                if not entry.name.endswith(".json") or not entry.is_file():
+                    continue
+                test = entry.name[: -len(".json")]
+                seen.add(test)
+                mtime = entry.stat().st_mtime_ns
+                if self.mtimes.get(test) != mtime:
+                    self.mtimes[test] = mtime
+                    changed.append(test)
+        for test in list(self.mtimes):
+            if test not in seen:
+                del self.mtimes[test]
+                changed.append(test)
+        return changed
+
+    def refresh(self) -> int:
+        changed = self.scan()
+        for test in changed:
+            if test in self.mtimes:
+                try:
+                    self.load_test(test)
+                except (OSError, ValueError) as e:
+                    # a file being replaced, picked up on the next scan
+                    logging.warning(f"failed to load coverage of {test}: {e!r}")
+                    self.mtimes.pop(test, None)
+            else:
+                self.remove_test(test)
+        return len(changed)
+
+    def covering(self, query: str) -> list[tuple[str, str, int]]:
+        class_name, _, method = query.partition("#")
+        if len(method) > 0:
+            names = [query]
+        else:
+            names = [name for name in self.postings if name.startswith(class_name + "#")]
+        res = [
+            (test, name, count)
+            for name in names
+            for test, count in self.postings.get(name, {}).items()
+        ]
+        res.sort(key=lambda item: (-item[2], item[0]))
+        return res
+
+
+class Daemon:
+    def __init__(self, call_log: str, store_dir: str, metric: str, interval: float):
+        self.lock = threading.RLock()
+        self.graph = CallGraphState()
+        self.cov = CoverageState(store_dir, metric)
+        self.interval = interval
+        self.jar_mtimes: dict[str, int] = {}
+        self.polls = 0
+        self.stopped = threading.Event()
+        start = time.perf_counter()
+        self.graph.load(call_log)
+        self.cov.refresh()
+        # jars newer than the call log have changed since it was generated
+        log_mtime = os.stat(call_log).st_mtime_ns if os.path.exists(call_log) else 0
+        for jar in self.graph.jar_classes:
+            self.jar_mtimes[jar] = log_mtime
+        logging.info(
+            f"loaded {len(self.graph.mapping)} callers and {len(self.cov.tests)} tests "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+
+    def poll_jars(self):
+        if self.polls % JAR_RESCAN_POLLS == 0:
+            for jar in collect_compiled_jars():
+                self.jar_mtimes.setdefault(jar, 0)
+        for jar, known in list(self.jar_mtimes.items()):
+            try:
+                mtime = os.stat(jar).st_mtime_ns
+            except FileNotFoundError:
+                # `mvn clean` in progress, keep the graph until the jar is rebuilt
+                continue
+            if mtime <= known:
+                continue
+            if self.graph.update_jar(jar, self.lock):
+                self.jar_mtimes[jar] = mtime
+
+    def watch(self):
+        while not self.stopped.wait(self.interval):
+            self.polls += 1
+            try:
+                self.poll_jars()
+                with self.lock:
+                    changed = self.cov.refresh()
+                if changed > 0:
+                    logging.info(f"reloaded coverage of {changed} tests")
+            except Exception as e:
+                logging.error(f"watcher error: {e!r}")
+
+    def handle(self, request: dict) -> dict:
+        op = request.get("op")
+        with self.lock:
+            if op == "ping":
+                return {"ok": True}
+            if op == "stats":
+                return {
+                    "ok": True,
+                    "callers": len(self.graph.mapping),
+                    "cached_chains": len(self.graph.chains),
+                    "jars": len(self.jar_mtimes),
+                    "tests": len(self.cov.tests),
+                    "covered_methods": len(self.cov.postings),
+                }
+            if op == "call_chain":
+                ut = self.graph.resolve(request.get("test", ""))
+                if ut is None:
+                    return {"ok": False, "error": f"unknown method {request.get('test')}"}
+                entries, truncated = self.graph.call_chain(ut)
+                return {
+                    "ok": True,
+                    "test": str(ut),
+                    "truncated": truncated,
+                    "entries": [
+                        {"callee": str(entry.callee), "level": entry.level}
+                        for entry in entries
+                    ],
+                }
+            if op == "covering":
+                return {
+                    "ok": True,
+                    "tests": [
+                        {"test": test, "method": name, "covered": count}
+                        for test, name, count in self.cov.covering(request.get("method", ""))
+                    ],
+                }
+            if op == "coverage":
+                test = request.get("test", "")
+                if test not in self.cov.tests:
+                    return {"ok": False, "error": f"no coverage for {test}"}
+                return {"ok": True, "methods": sorted(self.cov.tests[test])}
+        return {"ok": False, "error": f"unknown op {op}"}
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon: Daemon = self.server.daemon  # type: ignore[attr-defined]
+        for line in self.rfile:
+            try:
+                response = daemon.handle(json.loads(line))
+            except Exception as e:
+                response = {"ok": False, "error": repr(e)}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, daemon: Daemon):
+        self.daemon = daemon
+        super().__init__(path, RequestHandler)
+
+
+def serve(args):
+    if os.path.exists(args.socket):
+        # a stale socket of a dead daemon, refuse to start next to a live one
+        if query(args.socket, {"op": "ping"}, quiet=True) is not None:
+            logging.error(f"a daemon is already listening on {args.socket}")
+            return
+        os.remove(args.socket)
+    daemon = Daemon(args.call_log, args.store, args.metric, args.interval)
+    watcher = threading.Thread(target=daemon.watch, name="watcher", daemon=True)
+    watcher.start()
+    with DaemonServer(args.socket, daemon) as server:
+        logging.info(f"listening on {args.socket}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            daemon.stopped.set()
+            os.remove(args.socket)
+
+
+def query(path: str, request: dict, quiet: bool = False) -> dict | None:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as f:
+                return json.loads(f.readline())
+    except OSError as e:
+        if not quiet:
+            logging.error(f"failed to reach the daemon at {path}: {e}")
+        return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Call graph and coverage query daemon")
+    parser.add_argument("--socket", default=DAEMON_SOCKET, help="unix socket path")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve_parser = sub.add_parser("serve", help="run the daemon")
+    serve_parser.add_argument("--call-log", default=CALL_LOG, help="javacg call log")
+    serve_parser.add_argument("--store", default=UT_COV_DIR, help="coverage store dir")
+    serve_parser.add_argument("-m", "--metric", default=DEFAULT_METRIC)
+    serve_parser.add_argument(
+        "-i", "--interval", type=float, default=2.0, help="watch poll interval (s)"
+    )
+    query_parser = sub.add_parser("query", help="send one query")
+    query_parser.add_argument(
+        "op", choices=["ping", "stats", "call_chain", "covering", "coverage"]
+    )
+    query_parser.add_argument("arg", nargs="?", default="", help="test or method name")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == "serve":
+        serve(args)
+        return
+    request = {"op": args.op}
+    if args.op in ("call_chain", "coverage"):
+        request["test"] = args.arg
+    elif args.op == "covering":
+        request["method"] = args.arg
+    response = query(args.socket, request)
+    if response is None:
+        exit(1)
+    print(json.dumps(response, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+inverted coverage index: jacoco location -> posting list of covering tests
+
+kept in a sqlite database next to the coverage store and updated by run_cov after each test,
+so per-method lookups, union coverage and test set minimization do not have to parse ut_cov_data.
+a posting is (location, test, covered, missed) for the chosen metric, only locations with covered > 0 are indexed.
+"""
+
+import argparse
+import heapq
+import os
+import sqlite3
+import threading
+
+import cov_store
+from config import UT_COV_DIR
+from utils import to_bitset
+
+COV_INDEX_DB = os.path.join(UT_COV_DIR, "index.sqlite")
+DEFAULT_METRIC = "INSTRUCTION"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tests (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS locations (
+    id INTEGER PRIMARY KEY,
+    package TEXT NOT NULL,
+    classes TEXT NOT NULL,
+    method TEXT NOT NULL,
+    UNIQUE (classes, method)
+);
+CREATE TABLE IF NOT EXISTS postings (
+    loc_id INTEGER NOT NULL,
+    test_id INTEGER NOT NULL,
+    covered INTEGER NOT NULL,
+    missed INTEGER NOT NULL,
+    PRIMARY KEY (loc_id, test_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_test ON postings (test_id);
+"""
+
+
+def parse_method_query(query: str) -> tuple[str, str]:
+    """
+    `org.foo.Bar#baz` -> ("org/foo/Bar", "baz"), a bare class name selects all its methods ("")
+    """
+    class_name, _, method = query.partition("#")
+    return class_name.replace(".", "/"), method
+
+
+class CovIndex:
+    def __init__(self, db_path: str = COV_INDEX_DB, metric: str = DEFAULT_METRIC):
+        dir_path = os.path.dirname(db_path)
+        if len(dir_path) > 0 and not os.path.exists(dir_path):
+            os.makedirs(dir_path, exist_ok=True)
+        self.metric = metric
+        # run_cov may index from its post-processing threads
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.loc_ids: dict[tuple[str, str], int] = {}
+
+    def close(self):
+        self.conn.close()
+
+    def location_id(self, package: str, classes: str, method: str) -> int:
+        key = (classes, method)
+        loc_id = self.loc_ids.get(key)
+        if loc_id is not None:
+            return loc_id
+        self.conn.execute(
+            "INSERT OR IGNORE INTO locations (package, classes, method) VALUES (?, ?, ?)",
+            (package, classes, method),
+        )
+        row = self.conn.execute(
+            "SELECT id FROM locations WHERE classes = ? AND method = ?", key
+        ).fetchone()
+        self.loc_ids[key] = row[0]
+        return row[0]
+
+    def add(self, test_method: str, records: list[dict]):
+        """
+        (re)index one test, records are in the cov_store shape: {"loc": {...}, "cov": {metric: {...}}}
+        """
+        # overloaded methods share a location, their counters are summed
+        counts: dict[tuple[str, str, str], list[int]] = {}
+        for rec in records:
+            cov = rec["cov"].get(self.metric)
+            if cov is None or cov["covered"] == 0:
+                continue
+            loc = rec["loc"]
+            key = (loc["package"], loc["classes"], loc["method"])
+            count = counts.setdefault(key, [0, 0])
+            count[0] += cov["covered"]
+            count[1] += cov["missed"]
+
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO tests (name) VALUES (?)", (test_method,)
+            )
+            test_id = self.conn.execute(
+                "SELECT id FROM tests WHERE name = ?", (test_method,)
+            ).fetchone()[0]
+            self.conn.execute("DELETE FROM postings WHERE test_id = ?", (test_id,))
+            self.conn.executemany(
+                "INSERT INTO postings (loc_id, test_id, covered, missed) VALUES (?, ?, ?, ?)",
+                [
+                    (self.location_id(*key), test_id, covered, missed)
+                    for key, (covered, missed) in counts.items()
+                ],
+            )
+
+    def covering_tests(self, query: str) -> list[tuple[str, str, int]]:
+        """
+        tests covering a method (`org.foo.Bar#baz`) or any method of a class (`org.foo.Bar`),
+        as (test, method, covered) with the most covered first
+        """
+        classes, method = parse_method_query(query)
+        sql = """
+            SELECT tests.name, locations.method, postings.covered
+            FROM locations
+            JOIN postings ON postings.loc_id = locations.id
+            JOIN tests ON tests.id = postings.test_id
+            WHERE locations.classes = ?"""
+        params: tuple = (classes,)
+        if len(method) > 0:
+            sql += " AND locations.method = ?"
+            params += (method,)
+        sql += " ORDER BY postings.covered DESC, tests.name"
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def test_locations(self, tests: list[str] | None = None) -> dict[str, set[int]]:
+        """
+        covered location ids per test, of all tests or only the given ones
+        """
+        with self.lock:
+            names = dict(self.conn.execute("SELECT id, name FROM tests").fetchall())
+            if tests is None:
+                rows = self.conn.execute("SELECT test_id, loc_id FROM postings").fetchall()
+            else:
+                # the wanted names go through a temp table, so long lists stay one query,
+                # CROSS JOIN keeps sqlite from scanning all postings first
+                self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (name TEXT PRIMARY KEY)")
+                self.conn.execute("DELETE FROM wanted")
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO wanted (name) VALUES (?)", [(t,) for t in tests]
+                )
+                rows = self.conn.execute(
+                    """
+                    SELECT postings.test_id, postings.loc_id
+                    FROM wanted
+                    CROSS JOIN tests ON tests.name = wanted.name
+                    CROSS JOIN postings ON postings.test_id = tests.id"""
+                ).fetchall()
+        res: dict[int, set[int]] = {}
+        for test_id, loc_id in rows:
+            locs = res.get(test_id)
+            if locs is None:
+                locs = res[test_id] = set()
+            locs.add(loc_id)
+        return {names[test_id]: locs for test_id, locs in res.items()}
+
+    def location_names(self, loc_ids: set[int]) -> list[str]:
+        res = []
+        ids = list(loc_ids)
+        # stay below sqlite's bound parameter limit
+        for start in range(0, len(ids), 500):
+            chunk = ids[start : start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            with self.lock:
+                rows = self.conn.execute(
+                    f"SELECT classes, method FROM locations WHERE id IN ({placeholders})", chunk
+                ).fetchall()
+            res.extend(f"{classes.replace('/', '.')}#{method}" for classes, method in rows)
+        res.sort()
+        return res
+
+    def union_coverage(self, tests: list[str]) -> set[int]:
+        res: set[int] = set()
+        for locs in self.test_locations(tests).values():
+            res |= locs
+        return res
+
+    def minimal_test_set(self, tests: list[str] | None = None) -> list[tuple[str, int]]:
+        """
+        greedy set cover: repeatedly pick the test adding the most uncovered locations,
+        returns (test, newly covered count) in pick order, covering the same locations as all given tests.
+        gains only shrink as locations get covered, so stale heap entries are re-scored lazily
+        """
+        # location id bitsets make the gain of a test one and-not and a popcount
+        remaining = {
+            name: to_bitset(list(locs)) for name, locs in self.test_locations(tests).items()
+        }
+        covered = 0
+        picked = []
+        heap = [(-bits.bit_count(), name) for name, bits in remaining.items() if bits != 0]
+        heapq.heapify(heap)
+        while len(heap) > 0:
+            _, name = heapq.heappop(heap)
+            gain = (remaining[name] & ~covered).bit_count()
+            if gain == 0:
+                continue
+            # the other entries' gains are upper bounds, so it is the best pick unless one still ranks before it
+            if len(heap) > 0 and heap[0] < (-gain, name):
+                heapq.heappush(heap, (-gain, name))
+                continue
+            covered |= remaining[name]
+            picked.append((name, gain))
+        return picked
+
+    def rebuild(self, store_dir: str = UT_COV_DIR) -> int:
+        tests = cov_store.list_tests(store_dir)
+        for test in tests:
+            self.add(test, cov_store.load(test, store_dir))
+        return len(tests)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Query the inverted coverage index")
+    parser.add_argument("--db", default=COV_INDEX_DB, help="index database")
+    parser.add_argument("-m", "--metric", default=DEFAULT_METRIC, help="indexed metric")
+    sub = parser.add_subparsers(dest="command", required=True)
+    covering = sub.add_parser("covering", help="tests covering a method or class")
+    covering.add_argument("method", help="org.foo.Bar#baz or org.foo.Bar")
+    union = sub.add_parser("union", help="methods covered by any of the tests")
+    union.add_argument("tests", nargs="+")
+    minimize = sub.add_parser("minimize", help="greedy minimal test set")
+    minimize.add_argument("tests", nargs="*", help="candidate tests, default all")
+    rebuild = sub.add_parser("rebuild", help="rebuild the index from the coverage store")
+    rebuild.add_argument("-s", "--store", default=UT_COV_DIR, help="coverage store dir")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    index = CovIndex(args.db, args.metric)
+    if args.command == "covering":
+        for test, method, covered in index.covering_tests(args.method):
+            print(f"{covered:8d}  {test}  ({method})")
+    elif args.command == "union":
+        locs = index.union_coverage(args.tests)
+        for name in index.location_names(locs):
+            print(name)
+        print(f"{len(locs)} methods covered")
+    elif args.command == "minimize":
+        picked = index.minimal_test_set(args.tests or None)
+        for test, gain in picked:
+            print(f"{gain:8d}  {test}")
+        print(f"{len(picked)} tests")
+    else:
+        print(f"indexed {index.rebuild(args.store)} tests")
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+content addressed per-test coverage store
+
+layout of the store directory (ut_cov_data):
+- objects/<xx>/<digest>.json.gz: a coverage vector, the record list of one jacoco report, stored once per content
+- <test_method>.json: a small reference, either {"ref": digest}
+  or, in delta mode, {"base": digest, "delta": {index: cov}} against the first vector stored for the test class
+- bases/<test_class>: digest of the class baseline used for deltas
+per-test files written by older versions (the full record list) are still loaded transparently
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+OBJECT_DIR = "objects"
+BASE_DIR_NAME = "bases"
+# store a delta when at most this fraction of the records differ from the class baseline
+DELTA_RATIO = 0.1
+# coverage json compresses well even at the fastest level
+COMPRESS_LEVEL = 1
+
+
+def canonical_bytes(records: list[dict]) -> bytes:
+    return json.dumps(records, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def vector_digest(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def object_path(store_dir: str, digest: str) -> str:
+    return os.path.join(store_dir, OBJECT_DIR, digest[:2], digest + ".json.gz")
+
+
+def legacy_object_path(store_dir: str, digest: str) -> str:
+    # objects were stored uncompressed before
+    return os.path.join(store_dir, OBJECT_DIR, digest[:2], digest + ".json")
+
+
+def ref_path(store_dir: str, test_method: str) -> str:
+    return os.path.join(store_dir, test_method + ".json")
+
+
+def base_path(store_dir: str, test_method: str) -> str:
+    test_class = test_method.split("#")[0]
+    return os.path.join(store_dir, BASE_DIR_NAME, test_class)
+
+
+def atomic_write(file_path: str, data: bytes):
+    dir_path = os.path.dirname(file_path)
+    if not os.path.exists(dir_path):
+        os.makedirs(dir_path, exist_ok=True)
+    # a unique temp file per writer, post-processing threads may store the same object concurrently
+    fd, tmp_path = tempfile.mkstemp(
+        dir=dir_path, prefix=os.path.basename(file_path) + ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def put_object(store_dir: str, records: list[dict]) -> tuple[str, int]:
+    """
+    returns the digest and the number of bytes written (0 if the vector was already stored)
+    """
+    data = canonical_bytes(records)
+    digest = vector_digest(data)
+    path = object_path(store_dir, digest)
+    if os.path.exists(path) or os.path.exists(legacy_object_path(store_dir, digest)):
+        return digest, 0
+    compressed = gzip.compress(data, COMPRESS_LEVEL)
+    try:
+        atomic_write(path, compressed)
+    except OSError:
+        # another writer stored the same content first
+        if not os.path.exists(path):
+            raise
+        return digest, 0
+    return digest, len(compressed)
+
+
+def get_object(store_dir: str, digest: str) -> list[dict]:
+    path = object_path(store_dir, digest)
+    if not os.path.exists(path):
+        with open(legacy_object_path(store_dir, digest), "r", encoding="utf-8") as f:
+            return json.load(f)
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def same_locations(records: list[dict], base: list[dict]) -> bool:
+    if len(records) != len(base):
+        return False
+    for rec, base_rec in zip(records, base):
+        if rec["loc"] != base_rec["loc"]:
+            return False
+    return True
+
+
+def compute_delta(records: list[dict], base: list[dict]) -> dict[str, dict] | None:
+    """
+    positional delta of the counters, jacoco locations carry no method descriptor,
+    so overloaded methods share a location and records can only be matched by report order
+    """
+    if not same_locations(records, base):
+        return None
+    delta = {}
+    for ind, (rec, base_rec) in enumerate(zip(records, base)):
+        if rec["cov"] != base_rec["cov"]:
+            delta[str(ind)] = rec["cov"]
+    if len(delta) > DELTA_RATIO * len(records):
+        return None
+    return delta
+
+
+def persist(
+    test_method: str, records: list[dict], store_dir: str, delta_mode: bool = False
+) -> int:
+    """
+    store the coverage vector of a test, returns the number of bytes written
+    """
+    written = 0
+    if delta_mode:
+        base_file = base_path(store_dir, test_method)
+        if os.path.exists(base_file):
+            with open(base_file, "r", encoding="utf-8") as f:
+                base_digest = f.read().strip()
+            delta = compute_delta(records, get_object(store_dir, base_digest))
+            if delta is not None and len(delta) > 0:
+                ref = json.dumps({"base": base_digest, "delta": delta}).encode("utf-8")
+                atomic_write(ref_path(store_dir, test_method), ref)
+                return len(ref)
+
+    digest, written = put_object(store_dir, records)
+    if delta_mode and not os.path.exists(base_path(store_dir, test_method)):
+        atomic_write(base_path(store_dir, test_method), digest.encode("utf-8"))
+    ref = json.dumps({"ref": digest}).encode("utf-8")
+    atomic_write(ref_path(store_dir, test_method), ref)
+    return written + len(ref)
+
+
+def read_ref(test_method: str, store_dir: str) -> list | dict:
+    with open(ref_path(store_dir, test_method), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def resolve(content: list | dict, store_dir: str) -> list[dict]:
+    """
+    records of a per-test file's content as returned by read_ref
+    """
+    # legacy per-test file holding the full record list
+    if isinstance(content, list):
+        return content
+    if "ref" in content:
+        return get_object(store_dir, content["ref"])
+    records = get_object(store_dir, content["base"])
+    for ind, cov in content["delta"].items():
+        records[int(ind)] = dict(records[int(ind)], cov=cov)
+    return records
+
+
+def load(test_method: str, store_dir: str) -> list[dict]:
+    return resolve(read_ref(test_method, store_dir), store_dir)
+
+
+def list_tests(store_dir: str) -> list[str]:
+    if not os.path.exists(store_dir):
+        return []
+    tests = []
+    for file_name in os.listdir(store_dir):
+        if file_name.endswith(".json"):
+            tests.append(file_name[: -len(".json")])
+    tests.sort()
+    return tests
@@ -1,16 +1,37 @@
 # test call extraction
 import argparse
 import json
+import logging
 import os
 import pickle
 import re
-from dataclasses import dataclass
-
-from config import BASE_DIR, CALL_ENTRY_JSON, CALL_ENTRY_PICKLE, CALL_LOG, LOG_DIR
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Iterable
+
+import metrics
+from config import (
+    BASE_DIR,
+    CALL_ENTRY_JSON,
+    CALL_ENTRY_KEY,
+    CALL_ENTRY_PICKLE,
+    CALL_ENTRY_TRUNCATED,
+    CALL_LOG,
+    EXCLUDE_PATTERNS,
+    INCLUDE_PATTERNS,
+    LOG_DIR,
+    MAX_CALL_DEPTH,
+    MAX_CALL_ENTRIES,
+    MAX_CALL_SECONDS,
+)
+from pkg_filter import PackageFilter
+from utils import open_text
 
 # TODO: automatically extract package project_prefix
 
 package_project_prefix = ""
+include_patterns: list[str] = INCLUDE_PATTERNS
+exclude_patterns: list[str] = EXCLUDE_PATTERNS
 
 
 @dataclass
@@ -18,6 +39,9 @@ class Method:
     class_name: str
     func_name: str
     arg_types: list[str]
+    # project membership bit of the interned object, valid while member_gen == membership_gen
+    member: bool = field(default=False, compare=False, repr=False)
+    member_gen: int = field(default=-1, compare=False, repr=False)
 
     def __str__(self) -> str:
         return f"{self.class_name}:{self.func_name}({','.join(self.arg_types)})"
@@ -42,6 +66,22 @@ class CallEnry:
     level: int
 
 
+@dataclass
+class TraversalBudget:
+    """
+    per unit test limits of the call chain traversal, 0 means unlimited
+    """
+
+    max_depth: int = 0
+    max_entries: int = 0
+    max_seconds: float = 0.0
+
+
+TRUNC_DEPTH = "max_depth"
+TRUNC_ENTRIES = "max_entries"
+TRUNC_TIME = "max_seconds"
+
+
 test_method_call_mapping: dict[Method, list[Method]] = {}
 
 method_pat = re.compile(r"([\w[\]$.]+):([\w<>$]+)\(([\w.[\]$,]*)\)")
@@ -49,6 +89,14 @@ method_pat = re.compile(r"([\w[\]$.]+):([\w<>$]+)\(([\w.[\]$,]*)\)")
 debug_mode = False
 try_mode = False
 
+include_filter = PackageFilter([])
+exclude_filter = PackageFilter([])
+# membership memo per class name, the per method bit lives on the interned Method object
+class_membership: dict[str, bool] = {}
+# bumped by set_project_filter, invalidating every method's bit at once
+membership_gen = 0
+traversal_budget = TraversalBudget(MAX_CALL_DEPTH, MAX_CALL_ENTRIES, MAX_CALL_SECONDS)
+
 
 def extract_method(sub_record: str) -> tuple[Method, int]:
     m = method_pat.match(sub_record)
@@ -68,6 +116,10 @@ def extract_method_record(record: str) -> Record | None:
     return Record(caller, callee, call_type)
 
 
+def is_unit_test_method(method: Method) -> bool:
+    return method.class_name.endswith("Test") and method.func_name.startswith("test")
+
+
 def collect_unit_test_method(
     test_method_call_mapping: dict[Method, list[Method]]
 ) -> list[Method]:
@@ -82,7 +134,7 @@ def collect_unit_test_method(
 
     unit_test_methods = []
     for method in test_method_call_mapping.keys():
-        if method.class_name.endswith("Test") and method.func_name.startswith("test"):
+        if is_unit_test_method(method):
             unit_test_methods.append(method)
     # persist
     with open(log_file, "w", encoding="utf-8") as f:
@@ -97,52 +149,218 @@ def construct_method_call_mapping(call_log: str) -> dict[Method, list[Method]]:
     - call log file
     - result name(no need to worry about in local scope)
     """
+    with open_text(call_log) as f:
+        return mapping_from_lines(f, {})
+
+
+def mapping_from_lines(
+    lines: Iterable[str], interned: dict[Method, Method]
+) -> dict[Method, list[Method]]:
+    """
+    build the call mapping from javacg output lines,
+    `interned` keeps one Method object per distinct method (shared across calls), so per-method data can be attached to the object
+    """
     method_call_mapping = {}
-    with open(call_log, "r", encoding="utf-8") as f:
-        for line in f:
-            record = extract_method_record(line)
-            if record is None:
-                continue
-            if record.caller not in method_call_mapping:
-                method_call_mapping[record.caller] = set()
+    for line in lines:
+        record = extract_method_record(line)
+        if record is None:
+            continue
+        record.caller = interned.setdefault(record.caller, record.caller)
+        record.callee = interned.setdefault(record.callee, record.callee)
+        if record.caller not in method_call_mapping:
+            method_call_mapping[record.caller] = set()
 
-            method_call_mapping[record.caller].add(record.callee)
+        method_call_mapping[record.caller].add(record.callee)
     for key, val in method_call_mapping.items():
         method_call_mapping[key] = list(val)
     return method_call_mapping
 
 
+def set_project_filter(
+    prefix: str, include: list[str] | None = None, exclude: list[str] | None = None
+):
+    """
+    a class belongs to the project if it matches an include glob (the common prefix if none are given)
+    and no exclude glob, see pkg_filter. resets the memoized membership mask
+    """
+    global package_project_prefix, include_filter, exclude_filter, membership_gen
+    package_project_prefix = prefix
+    include_filter = PackageFilter(include or [])
+    exclude_filter = PackageFilter(exclude or [])
+    class_membership.clear()
+    membership_gen += 1
+
+
+def is_project_class(class_name: str) -> bool:
+    member = class_membership.get(class_name)
+    if member is None:
+        if len(include_filter) > 0:
+            member = include_filter.matches(class_name)
+        else:
+            member = class_name.startswith(package_project_prefix)
+        if member and len(exclude_filter) > 0:
+            member = not exclude_filter.matches(class_name)
+        class_membership[class_name] = member
+    return member
+
+
+def is_project_method(method: Method) -> bool:
+    """
+    a precomputed bit on the interned method object, no hashing of the method's signature
+    """
+    if method.member_gen == membership_gen:
+        return method.member
+    method.member = is_project_class(method.class_name)
+    method.member_gen = membership_gen
+    return method.member
+
+
+def build_membership_mask(method_call_mapping: dict[Method, list[Method]]) -> tuple[int, int]:
+    """
+    decide project membership once per interned method (the callee objects of the mapping),
+    returns the number of distinct callees and of project members among them
+    """
+    methods = 0
+    members = 0
+    for callees in method_call_mapping.values():
+        for callee in callees:
+            if callee.member_gen == membership_gen:
+                continue
+            methods += 1
+            members += is_project_method(callee)
+    return methods, members
+
+
+def prune_call_mapping(
+    method_call_mapping: dict[Method, list[Method]]
+) -> dict[Method, list[Method]]:
+    """
+    drop edges into excluded methods before traversal, so their subgraphs are never visited
+    """
+    build_membership_mask(method_call_mapping)
+    pruned = {}
+    for caller, callees in method_call_mapping.items():
+        kept = [callee for callee in callees if callee.member]
+        if len(kept) > 0:
+            pruned[caller] = kept
+    return pruned
+
+
+def has_unseen_member(
+    method: Method, test_method_call_mapping: dict[Method, list[Method]], seen: set[Method]
+) -> bool:
+    for callee in test_method_call_mapping.get(method, []):
+        if callee not in seen and is_project_method(callee):
+            return True
+    return False
+
+
 def traverse_ut_call_tree(
     root: Method,
     test_method_call_mapping: dict[Method, list[Method]],
     depth: int,
     entries: list[CallEnry],
-):
+    seen: set[Method] | None = None,
+    budget: TraversalBudget | None = None,
+) -> str:
+    """
+    depth first, pre-order: a callee is entered right after it is recorded (explicit stack, no recursion limit),
+    level order instead under a depth budget (traverse_level_order).
+    returns "" when the traversal completed, otherwise the budget that cut it short (TRUNC_*)
+    """
+    if seen is None:
+        seen = {entry.callee for entry in entries}
+    if budget is None:
+        budget = TraversalBudget()
     if root not in test_method_call_mapping:
-        return
-    for callee in test_method_call_mapping[root]:
+        return ""
+    deadline = time.monotonic() + budget.max_seconds if budget.max_seconds > 0 else 0.0
+    if budget.max_depth > 0:
+        return traverse_level_order(
+            root, test_method_call_mapping, depth, entries, seen, budget, deadline
+        )
+    truncated = ""
+    steps = 0
+    stack = [(iter(test_method_call_mapping[root]), depth)]
+    while len(stack) > 0:
+        callees, level = stack[-1]
+        callee = next(callees, None)
+        if callee is None:
+            stack.pop()
+            continue
 
+        steps += 1
+        if deadline > 0 and steps % 1024 == 0 and time.monotonic() > deadline:
+            return TRUNC_TIME
         # judge if callee in entreis
-        flag = False
-        for entry in entries:
-            if callee == entry.callee:
-                flag = True
-                break
-        if flag:
+        if callee in seen:
+            continue
+        if not is_project_method(callee):
             continue
-        if not callee.class_name.startswith(package_project_prefix):
+        if budget.max_entries > 0 and len(entries) >= budget.max_entries:
+            return TRUNC_ENTRIES
+        seen.add(callee)
+        entries.append(CallEnry(callee, level))
+        if callee not in test_method_call_mapping:
             continue
-        entries.append(CallEnry(callee, depth))
-        traverse_ut_call_tree(callee, test_method_call_mapping, depth + 1, entries)
+        stack.append((iter(test_method_call_mapping[callee]), level + 1))
+    return truncated
+
+
+def traverse_level_order(
+    root: Method,
+    test_method_call_mapping: dict[Method, list[Method]],
+    depth: int,
+    entries: list[CallEnry],
+    seen: set[Method],
+    budget: TraversalBudget,
+    deadline: float,
+) -> str:
+    """
+    breadth first under a depth budget: every method is recorded at its shallowest level,
+    a depth first walk could mark a method seen at the cut level before reaching it on a shorter path
+    """
+    steps = 0
+    frontier = [root]
+    level = depth
+    while len(frontier) > 0:
+        if level > budget.max_depth:
+            # only a cut if something new lies below
+            for method in frontier:
+                if has_unseen_member(method, test_method_call_mapping, seen):
+                    return TRUNC_DEPTH
+            return ""
+        next_frontier = []
+        for method in frontier:
+            for callee in test_method_call_mapping.get(method, []):
+                steps += 1
+                if deadline > 0 and steps % 1024 == 0 and time.monotonic() > deadline:
+                    return TRUNC_TIME
+                if callee in seen:
+                    continue
+                if not is_project_method(callee):
+                    continue
+                if budget.max_entries > 0 and len(entries) >= budget.max_entries:
+                    return TRUNC_ENTRIES
+                seen.add(callee)
+                entries.append(CallEnry(callee, level))
+                if callee in test_method_call_mapping:
+                    next_frontier.append(callee)
+        frontier = next_frontier
+        level += 1
+    return ""
 
 
 def construct_ut_call_tree(
     ut: Method,
     method_call_mapping: dict[Method, list[Method]],
     call_entries: dict[Method, list[CallEnry]],
-):
+    budget: TraversalBudget | None = None,
+) -> str:
     call_entries[ut] = []
-    traverse_ut_call_tree(ut, method_call_mapping, 1, call_entries[ut])
+    return traverse_ut_call_tree(
+        ut, method_call_mapping, 1, call_entries[ut], budget=budget
+    )
 
 
 def call_entries_pretty_persist(call_entries: dict[Method, list[CallEnry]]):
@@ -152,8 +370,37 @@ def call_entries_pretty_persist(call_entries: dict[Method, list[CallEnry]]):
         json_obj[str(key)] = [
             {"callee": str(entry.callee), "level": entry.level} for entry in val
         ]
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(json_obj, f, indent=4)
+    with metrics.phase("call_entries_pretty_persist"):
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(json_obj, f, indent=4)
+
+
+def call_entry_cache_key() -> dict:
+    """
+    everything besides the call log that shapes the call entries
+    """
+    return {
+        "prefix": package_project_prefix,
+        "include": sorted(include_filter.patterns),
+        "exclude": sorted(exclude_filter.patterns),
+        "budget": asdict(traversal_budget),
+    }
+
+
+def load_cached_call_entries(log_file: str, key: dict) -> dict[Method, list[CallEnry]] | None:
+    """
+    the pickle and the truncated list are only reused together, as written by the same run
+    """
+    for file_path in (log_file, CALL_ENTRY_KEY, CALL_ENTRY_TRUNCATED):
+        if not os.path.exists(file_path):
+            return None
+    with open(CALL_ENTRY_KEY, "r", encoding="utf-8") as f:
+        cached_key = json.load(f)
+    if cached_key != key:
+        logging.warning(f"call entries were built with {cached_key}, rebuilding with {key}")
+        return None
+    with open(log_file, "rb") as f:
+        return pickle.load(f)
 
 
 def construct_call_entry_mapping(
@@ -161,20 +408,40 @@ def construct_call_entry_mapping(
 ) -> dict[Method, list[CallEnry]]:
     log_name = CALL_ENTRY_PICKLE
     log_file = os.path.join(LOG_DIR, log_name)
-    if os.path.exists(log_file):
-        with open(log_file, "rb") as f:
-            return pickle.load(f)
+    key = call_entry_cache_key()
+    cached = load_cached_call_entries(log_file, key)
+    if cached is not None:
+        return cached
 
     call_entries = {}
+    truncated: dict[Method, str] = {}
     for ut in unit_test_methods:
-        construct_ut_call_tree(ut, method_call_mapping, call_entries)
+        reason = construct_ut_call_tree(
+            ut, method_call_mapping, call_entries, traversal_budget
+        )
+        if len(reason) > 0:
+            truncated[ut] = reason
+            logging.warning(
+                f"call chain of {ut} truncated ({reason}) at {len(call_entries[ut])} entries"
+            )
     with open(log_file, "wb") as f:
         pickle.dump(call_entries, f)
+    with open(CALL_ENTRY_KEY, "w", encoding="utf-8") as f:
+        json.dump(key, f, indent=4)
 
     call_entries_pretty_persist(call_entries)
+    truncated_persist(truncated)
     return call_entries
 
 
+def truncated_persist(truncated: dict[Method, str]):
+    """
+    unit tests whose call chain hit a traversal budget, with the budget that cut it
+    """
+    with open(CALL_ENTRY_TRUNCATED, "w", encoding="utf-8") as f:
+        json.dump({str(key): val for key, val in truncated.items()}, f, indent=4)
+
+
 def longest_common_prefix(strs: list[str]):
     """
     Find the longest common prefix string amongst an array of strings.
@@ -188,15 +455,13 @@ def longest_common_prefix(strs: list[str]):
     if not strs:
         return ""
 
-    # Start with the first string in the list as the prefix
-    prefix = strs[0]
-
-    for string in strs[1:]:
-        # Compare the prefix with each string and update the prefix
-        while string[: len(prefix)] != prefix and prefix != "":
-            prefix = prefix[: len(prefix) - 1]
-
-    return prefix
+    # the common prefix of all strings is the common prefix of the lexicographic extremes
+    first = min(strs)
+    last = max(strs)
+    for ind, ch in enumerate(first):
+        if ch != last[ind]:
+            return first[:ind]
+    return first
 
 
 def extract_project_prefix(uts: list[Method]) -> str:
@@ -207,23 +472,72 @@ def extract_project_prefix(uts: list[Method]) -> str:
 
 
 def get_call_chains():
-    method_call_mapping = construct_method_call_mapping(CALL_LOG)
-    unit_tests = collect_unit_test_method(method_call_mapping)
-    global package_project_prefix
-    package_project_prefix = extract_project_prefix(unit_tests)
-    call_entries = construct_call_entry_mapping(method_call_mapping, unit_tests)
+    with metrics.profile("construct_method_call_mapping"), metrics.phase(
+        "construct_method_call_mapping"
+    ) as m:
+        method_call_mapping = construct_method_call_mapping(CALL_LOG)
+        m["callers"] = len(method_call_mapping)
+    with metrics.phase("collect_unit_test_method") as m:
+        unit_tests = collect_unit_test_method(method_call_mapping)
+        m["unit_tests"] = len(unit_tests)
+    set_project_filter(
+        extract_project_prefix(unit_tests), include_patterns, exclude_patterns
+    )
+    with metrics.phase("prune_call_mapping") as m:
+        m["methods"], m["members"] = build_membership_mask(method_call_mapping)
+        method_call_mapping = prune_call_mapping(method_call_mapping)
+    with metrics.profile("construct_call_entry_mapping"), metrics.phase(
+        "construct_call_entry_mapping"
+    ) as m:
+        call_entries = construct_call_entry_mapping(method_call_mapping, unit_tests)
+        m["entries"] = sum(len(val) for val in call_entries.values())
 
 
 def parse_args():
-    global debug_mode, try_mode
+    global debug_mode, try_mode, include_patterns, exclude_patterns, traversal_budget
     parser = argparse.ArgumentParser(description="Extract call graph from log")
     parser.add_argument("-d", "--debug", action="store_true", help="Enable debug mode")
     parser.add_argument(
         "-t", "--try", action="store_true", help="try demo", dest="try_mode"
     )
+    parser.add_argument(
+        "-i",
+        "--include",
+        action="append",
+        default=[],
+        help="project package glob, e.g. org.foo.** (default: common prefix of the unit tests)",
+    )
+    parser.add_argument(
+        "-x",
+        "--exclude",
+        action="append",
+        default=[],
+        help="package glob left out of the call chains, e.g. **.generated.**",
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        default=traversal_budget.max_depth,
+        help="deepest call level followed per unit test, 0 for unlimited",
+    )
+    parser.add_argument(
+        "--max-entries",
+        type=int,
+        default=traversal_budget.max_entries,
+        help="call entries recorded per unit test, 0 for unlimited",
+    )
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=traversal_budget.max_seconds,
+        help="traversal wall time per unit test, 0 for unlimited",
+    )
     args = parser.parse_args()
     debug_mode = args.debug
     try_mode = args.try_mode
+    include_patterns = include_patterns + args.include
+    exclude_patterns = exclude_patterns + args.exclude
+    traversal_budget = TraversalBudget(args.max_depth, args.max_entries, args.max_seconds)
 
 
 def main():
@@ -231,4 +545,5 @@ def main():
 
 
 if __name__ == "__main__":
+    parse_args()
     main()
@@ -1,11 +1,18 @@
 # substitute the gen_callgraph bash script
+import gzip
 import os
+import shutil
 import subprocess
 import xml.etree.ElementTree as ET
+from typing import BinaryIO
 
+import metrics
 from config import BASE_DIR, CALL_LOG, LOG_DIR, TARGET_DIR
 from utils import prepare_dir
 
+JAVACG_JAR = "scripts/utils/javacg-0.1-SNAPSHOT-static.jar"
+COPY_BUFSIZE = 1024 * 1024
+
 
 def run_single_cmd(cmd: str) -> bool:
     return subprocess.run(cmd, shell=True).returncode == 0
@@ -27,38 +34,53 @@ def collect_compiled_jars() -> list[str]:
     return res
 
 
-def single_generation(jar_name: str) -> str | None:
-    dest_log = jar_name + ".log"
-    flag = run_single_cmd(
-        f"java -jar scripts/utils/javacg-0.1-SNAPSHOT-static.jar {jar_name} >{dest_log}"
-    )
-    if flag:
-        return dest_log
-    else:  # if failed, return None
-        return None
-
-
-def concatenate(log_list: list[str]):
-    log_list_str = " ".join(log_list)
-    run_single_cmd(f"cat {log_list_str} >{CALL_LOG}")
+def single_generation(jar_name: str, out: BinaryIO) -> bool:
+    """
+    stream the javacg output of a jar into the shared compressed log as one gzip member,
+    a failed jar's member is truncated away again
+    """
+    start = out.tell()
+    with metrics.phase("javacg", jar=jar_name) as m:
+        try:
+            proc = subprocess.Popen(
+                ["java", "-jar", JAVACG_JAR, jar_name], stdout=subprocess.PIPE
+            )
+        except OSError:
+            m["success"] = False
+            return False
+        assert proc.stdout is not None
+        with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=1) as gz:
+            shutil.copyfileobj(proc.stdout, gz, COPY_BUFSIZE)
+        flag = proc.wait() == 0
+        m["success"] = flag
+        m["compressed_bytes"] = out.tell() - start
+    if not flag:
+        out.seek(start)
+        out.truncate()
+    return flag
 
 
 def run_generation() -> bool:
     compiled_jars = collect_compiled_jars()
     if len(compiled_jars) == 0:
-        run_single_cmd("mvn package -Drat.skip=true -Dmaven.test.failure.ignore=true")
+        with metrics.phase("mvn_package"):
+            run_single_cmd(
+                "mvn package -Drat.skip=true -Dmaven.test.failure.ignore=true"
+            )
         compiled_jars = collect_compiled_jars()
 
-    log_list = []
-    for jar in compiled_jars:
-        dest_log = single_generation(jar)
-        if dest_log is None:
-            continue
-        log_list.append(dest_log)
+    # a single compressed artifact instead of per jar logs plus their concatenation
+    succ = 0
+    tmp_log = CALL_LOG + ".tmp"
+    with open(tmp_log, "wb") as out:
+        for jar in compiled_jars:
+            if single_generation(jar, out):
+                succ += 1
 
-    if len(log_list) == 0:
+    if succ == 0:
+        os.remove(tmp_log)
         return False
-    concatenate(log_list)
+    os.replace(tmp_log, CALL_LOG)
     return True
 
 
@@ -2,7 +2,8 @@
 
 mvn package -Drat.skip=true
 
-java -jar scripts/utils/javacg-0.1-SNAPSHOT-static.jar target/commons-lang3-3.15.0-SNAPSHOT-tests.jar >logs/test_call.log
-java -jar scripts/utils/javacg-0.1-SNAPSHOT-static.jar target/commons-lang3-3.15.0-SNAPSHOT.jar >logs/source_call.log
-
-cat logs/test_call.log logs/source_call.log >logs/test_source_call.log
+# stream both jars into one compressed log, no intermediate copies
+{
+	java -jar scripts/utils/javacg-0.1-SNAPSHOT-static.jar target/commons-lang3-3.15.0-SNAPSHOT-tests.jar
+	java -jar scripts/utils/javacg-0.1-SNAPSHOT-static.jar target/commons-lang3-3.15.0-SNAPSHOT.jar
+} | gzip -1 >logs/test_source_call.log.gz
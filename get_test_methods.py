@@ -5,6 +5,7 @@ import re
 import subprocess
 import xml.etree.ElementTree as ET
 
+import metrics
 from config import TEST_METHODS_FILE
 
 # Configure logging
@@ -83,17 +84,23 @@ def get_test_methods() -> list[str]:
             with open(filename, "r", encoding="utf-8") as f:
                 return json.load(f)
 
-    prepare_maven()
+    with metrics.phase("prepare_maven"):
+        prepare_maven()
     test_methods: list[str] = []
-    for dir in get_all_report_dirs():
-        test_methods.extend(collect_reported_methods(dir))
+    with metrics.phase("collect_reported_methods") as m:
+        report_dirs = get_all_report_dirs()
+        for dir in report_dirs:
+            test_methods.extend(collect_reported_methods(dir))
+        m["report_dirs"] = len(report_dirs)
+        m["test_methods"] = len(test_methods)
     return test_methods
 
 
 def main():
     test_methods = get_test_methods()
     test_methods.sort()
-    persist(test_methods)
+    with metrics.phase("persist"):
+        persist(test_methods)
     # print(test_methods)
 
 
@@ -0,0 +1,196 @@
+"""
+join the static call entries (extract_callgraph.py) with the dynamic per-test coverage (run_cov.py)
+
+both sides name methods differently:
+- javacg: `org.foo.Bar$Inner:baz(int,java.lang.String)`
+- jacoco: package `org/foo`, class `org/foo/Bar$Inner`, method `baz`
+every distinct raw name is normalized once to (dotted class, method name) and interned to an integer id.
+jacoco locations carry no descriptor, so overloads collapse to one id on both sides.
+per test the reachable and the covered ids become int bitsets and the join is two bitwise operations:
+reachable & ~covered (reachable but uncovered) and covered & ~reachable (covered but not statically reached)
+"""
+
+import argparse
+import json
+import os
+
+import cov_store
+import metrics
+from config import CALL_ENTRY_JSON, CALL_ENTRY_TRUNCATED, LOG_DIR, UT_COV_DIR
+from utils import bits_of, to_bitset
+
+JOIN_JSON = os.path.join(LOG_DIR, "static_dynamic_join.json")
+
+
+class MethodIndex:
+    def __init__(self):
+        self.ids: dict[tuple[str, str], int] = {}
+        self.names: list[str] = []
+        # memo of raw names to ids, so each distinct spelling is normalized once
+        self.javacg_memo: dict[str, int] = {}
+        self.jacoco_memo: dict[tuple[str, str], int] = {}
+
+    def intern(self, key: tuple[str, str]) -> int:
+        method_id = self.ids.get(key)
+        if method_id is None:
+            method_id = len(self.names)
+            self.ids[key] = method_id
+            self.names.append(f"{key[0]}#{key[1]}")
+        return method_id
+
+    def javacg_id(self, sig: str) -> int:
+        method_id = self.javacg_memo.get(sig)
+        if method_id is None:
+            class_name, _, func_name = sig.split("(", 1)[0].rpartition(":")
+            method_id = self.intern((class_name, func_name))
+            self.javacg_memo[sig] = method_id
+        return method_id
+
+    def jacoco_id(self, classes: str, method: str) -> int:
+        raw = (classes, method)
+        method_id = self.jacoco_memo.get(raw)
+        if method_id is None:
+            method_id = self.intern((classes.replace("/", "."), method))
+            self.jacoco_memo[raw] = method_id
+        return method_id
+
+
+def javacg_test_name(sig: str) -> str:
+    """
+    `org.foo.BarTest:testBaz()` -> `org.foo.BarTest#testBaz`, the run_cov test naming
+    """
+    class_name, _, func_name = sig.split("(", 1)[0].rpartition(":")
+    return f"{class_name}#{func_name}"
+
+
+def load_reachable(index: MethodIndex, entry_json: str) -> dict[str, int]:
+    with open(entry_json, "r", encoding="utf-8") as f:
+        call_entries = json.load(f)
+    reachable = {}
+    for ut, entries in call_entries.items():
+        ids = [index.javacg_id(entry["callee"]) for entry in entries]
+        reachable[javacg_test_name(ut)] = to_bitset(ids)
+    return reachable
+
+
+def load_truncated(truncated_json: str) -> dict[str, str]:
+    """
+    tests whose call chain hit a traversal budget, with the budget that cut it (see extract_callgraph)
+    """
+    if not os.path.exists(truncated_json):
+        return {}
+    with open(truncated_json, "r", encoding="utf-8") as f:
+        return {javacg_test_name(ut): reason for ut, reason in json.load(f).items()}
+
+
+def covered_bitset(index: MethodIndex, records: list[dict], metric: str) -> int:
+    ids = []
+    for rec in records:
+        cov = rec["cov"].get(metric)
+        if cov is None or cov["covered"] == 0:
+            continue
+        ids.append(index.jacoco_id(rec["loc"]["classes"], rec["loc"]["method"]))
+    return to_bitset(ids)
+
+
+def load_covered(index: MethodIndex, store_dir: str, metric: str) -> dict[str, int]:
+    covered = {}
+    # deduplicated vectors are converted once, see cov_store
+    by_digest: dict[str, int] = {}
+    for test in cov_store.list_tests(store_dir):
+        content = cov_store.read_ref(test, store_dir)
+        digest = content.get("ref") if isinstance(content, dict) else None
+        if digest is not None and digest in by_digest:
+            covered[test] = by_digest[digest]
+            continue
+        bits = covered_bitset(index, cov_store.resolve(content, store_dir), metric)
+        if digest is not None:
+            by_digest[digest] = bits
+        covered[test] = bits
+    return covered
+
+
+def join(
+    reachable: dict[str, int], covered: dict[str, int]
+) -> dict[str, tuple[int, int, int, int]]:
+    """
+    per test present on both sides: (reachable & ~covered, covered & ~reachable, reachable, covered)
+    """
+    res = {}
+    for test, reach in reachable.items():
+        cov = covered.get(test)
+        if cov is None:
+            continue
+        res[test] = (reach & ~cov, cov & ~reach, reach, cov)
+    return res
+
+
+def persist_join(
+    index: MethodIndex,
+    joined: dict[str, tuple[int, int, int, int]],
+    truncated: dict[str, str],
+    out: str,
+):
+    """
+    a truncated call chain understates the reachable set, so its covered_unreached is left out (null)
+    """
+    json_obj = {}
+    for test, (uncovered, unreached, reach, cov) in sorted(joined.items()):
+        reason = truncated.get(test, "")
+        json_obj[test] = {
+            "reachable": reach.bit_count(),
+            "covered": cov.bit_count(),
+            "truncated": reason,
+            "reachable_uncovered": [index.names[i] for i in bits_of(uncovered)],
+            "covered_unreached": (
+                None if len(reason) > 0 else [index.names[i] for i in bits_of(unreached)]
+            ),
+        }
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(json_obj, f, indent=4)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Join static call entries with per-test coverage"
+    )
+    parser.add_argument("-e", "--entries", default=CALL_ENTRY_JSON, help="call entry json")
+    parser.add_argument(
+        "-t", "--truncated", default=CALL_ENTRY_TRUNCATED, help="truncated call chains json"
+    )
+    parser.add_argument("-s", "--store", default=UT_COV_DIR, help="coverage store dir")
+    parser.add_argument("-m", "--metric", default="INSTRUCTION", help="coverage metric")
+    parser.add_argument("-o", "--out", default=JOIN_JSON, help="output json")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    index = MethodIndex()
+    with metrics.phase("load_reachable") as m:
+        reachable = load_reachable(index, args.entries)
+        truncated = load_truncated(args.truncated)
+        m["tests"] = len(reachable)
+        m["truncated"] = len(truncated)
+    with metrics.phase("load_covered") as m:
+        covered = load_covered(index, args.store, args.metric)
+        m["tests"] = len(covered)
+    with metrics.phase("join") as m:
+        joined = join(reachable, covered)
+        m["tests"] = len(joined)
+        m["methods"] = len(index.names)
+    with metrics.phase("persist_join"):
+        persist_join(index, joined, truncated, args.out)
+    truncated_joined = sum(1 for test in joined if test in truncated)
+    print(
+        f"joined {len(joined)} tests ({len(reachable)} static, {len(covered)} dynamic), "
+        f"{len(index.names)} methods, written to {args.out}"
+    )
+    if truncated_joined > 0:
+        print(
+            f"{truncated_joined} tests have truncated call chains, their covered_unreached is left out"
+        )
+
+
+if __name__ == "__main__":
+    main()
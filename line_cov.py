@@ -0,0 +1,296 @@
+"""
+line level per-test coverage
+
+covered lines of each source file are kept as bitmaps (python ints, bit n set when line n was hit),
+so union/intersection across tests are plain `|`/`&`.
+on disk a bitmap is run length encoded as inclusive ranges ("10-17,30,42-44") and stored twice:
+- <test>.json.gz: gzip compressed json mapping "<package dir>/<source file>" to its ranges, for per-test queries
+- sources/<package dir>/<source file>.rle: one "<test>\t<ranges>" line per test hitting the file (the last line
+  of a test wins, empty ranges drop it), so line queries open one file instead of every test's
+"""
+
+import argparse
+import gzip
+import json
+import os
+import shutil
+import threading
+
+import cov_store
+from config import UT_COV_DIR
+
+LINE_COV_DIR = os.path.join(UT_COV_DIR, "lines")
+SUFFIX = ".json.gz"
+SOURCE_DIR = "sources"
+SOURCE_SUFFIX = ".rle"
+# appends to the per-source files from concurrent persists must not interleave
+append_lock = threading.Lock()
+
+
+def runs_from_lines(lines: list[int]) -> list[tuple[int, int]]:
+    runs = []
+    for nr in sorted(set(lines)):
+        if len(runs) > 0 and runs[-1][1] == nr - 1:
+            runs[-1] = (runs[-1][0], nr)
+        else:
+            runs.append((nr, nr))
+    return runs
+
+
+def runs_from_bitmap(bits: int) -> list[tuple[int, int]]:
+    runs = []
+    offset = 0
+    while bits:
+        # skip the zero run, then measure the one run
+        zeros = (bits & -bits).bit_length() - 1
+        bits >>= zeros
+        offset += zeros
+        ones = (~bits & (bits + 1)).bit_length() - 1
+        runs.append((offset, offset + ones - 1))
+        bits >>= ones
+        offset += ones
+    return runs
+
+
+def bitmap_from_runs(runs: list[tuple[int, int]]) -> int:
+    bits = 0
+    for start, end in runs:
+        bits |= ((1 << (end - start + 1)) - 1) << start
+    return bits
+
+
+def bitmap_from_lines(lines: list[int]) -> int:
+    return bitmap_from_runs(runs_from_lines(lines))
+
+
+def lines_of(bits: int) -> list[int]:
+    lines = []
+    for start, end in runs_from_bitmap(bits):
+        lines.extend(range(start, end + 1))
+    return lines
+
+
+def encode_runs(runs: list[tuple[int, int]]) -> str:
+    return ",".join(
+        str(start) if start == end else f"{start}-{end}" for start, end in runs
+    )
+
+
+def decode_runs(text: str) -> list[tuple[int, int]]:
+    runs = []
+    if len(text) == 0:
+        return runs
+    for part in text.split(","):
+        start, _, end = part.partition("-")
+        runs.append((int(start), int(end or start)))
+    return runs
+
+
+def line_cov_path(test_method: str, store_dir: str) -> str:
+    return os.path.join(store_dir, test_method + SUFFIX)
+
+
+def source_path(source: str, store_dir: str) -> str:
+    return os.path.join(store_dir, SOURCE_DIR, source + SOURCE_SUFFIX)
+
+
+def append_source_lines(store_dir: str, records: dict[str, str], test_method: str):
+    with append_lock:
+        for source, text in records.items():
+            path = source_path(source, store_dir)
+            dir_path = os.path.dirname(path)
+            if not os.path.exists(dir_path):
+                os.makedirs(dir_path, exist_ok=True)
+            with open(path, "ab+") as f:
+                line = f"{test_method}\t{text}\n".encode("utf-8")
+                # a killed writer may have left a partial last line, start on a fresh one
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        line = b"\n" + line
+                f.write(line)
+
+
+def persist(test_method: str, line_cov: dict[str, list[int]], store_dir: str) -> int:
+    """
+    line_cov maps source files to their covered line numbers, returns the compressed size
+    """
+    if not os.path.exists(store_dir):
+        os.makedirs(store_dir, exist_ok=True)
+    encoded = {
+        source: encode_runs(runs_from_lines(lines))
+        for source, lines in line_cov.items()
+        if len(lines) > 0
+    }
+    # a rerun no longer hitting a source file clears its old line there
+    dropped = {}
+    if os.path.exists(line_cov_path(test_method, store_dir)):
+        dropped = {source: "" for source in load_encoded(test_method, store_dir)}
+    data = gzip.compress(json.dumps(encoded, sort_keys=True).encode("utf-8"), 6)
+    # a killed post-processing thread must not leave a truncated file behind
+    cov_store.atomic_write(line_cov_path(test_method, store_dir), data)
+    append_source_lines(store_dir, dict(dropped, **encoded), test_method)
+    return len(data)
+
+
+def load_encoded(test_method: str, store_dir: str) -> dict[str, str]:
+    with gzip.open(line_cov_path(test_method, store_dir), "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_source(source: str, store_dir: str = LINE_COV_DIR) -> dict[str, str]:
+    """
+    encoded ranges per test hitting a source file
+    """
+    path = source_path(source, store_dir)
+    res: dict[str, str] = {}
+    if not os.path.exists(path):
+        return res
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            test, sep, text = line.rstrip("\n").partition("\t")
+            if not line.endswith("\n") or len(sep) == 0:
+                # partial line of a killed writer
+                continue
+            if len(text) > 0:
+                res[test] = text
+            else:
+                res.pop(test, None)
+    return res
+
+
+def reindex(store_dir: str = LINE_COV_DIR) -> int:
+    """
+    rebuild the per-source files from the per-test files
+    """
+    with append_lock:
+        shutil.rmtree(os.path.join(store_dir, SOURCE_DIR), ignore_errors=True)
+    tests = list_tests(store_dir)
+    for test in tests:
+        append_source_lines(store_dir, load_encoded(test, store_dir), test)
+    return len(tests)
+
+
+def load(test_method: str, store_dir: str = LINE_COV_DIR) -> dict[str, int]:
+    encoded = load_encoded(test_method, store_dir)
+    return {source: bitmap_from_runs(decode_runs(text)) for source, text in encoded.items()}
+
+
+def list_tests(store_dir: str = LINE_COV_DIR) -> list[str]:
+    if not os.path.exists(store_dir):
+        return []
+    return sorted(
+        file_name[: -len(SUFFIX)]
+        for file_name in os.listdir(store_dir)
+        if file_name.endswith(SUFFIX)
+    )
+
+
+def union_cov(tests: list[str], store_dir: str = LINE_COV_DIR) -> dict[str, int]:
+    res: dict[str, int] = {}
+    for test in tests:
+        for source, bits in load(test, store_dir).items():
+            res[source] = res.get(source, 0) | bits
+    return res
+
+
+def intersection_cov(tests: list[str], store_dir: str = LINE_COV_DIR) -> dict[str, int]:
+    res: dict[str, int] | None = None
+    for test in tests:
+        cov = load(test, store_dir)
+        if res is None:
+            res = cov
+            continue
+        res = {
+            source: bits & cov[source]
+            for source, bits in res.items()
+            if source in cov and bits & cov[source]
+        }
+    return res or {}
+
+
+def source_bitmaps(
+    source: str, tests: list[str], store_dir: str = LINE_COV_DIR
+) -> list[int]:
+    encoded = load_source(source, store_dir)
+    return [bitmap_from_runs(decode_runs(encoded.get(test, ""))) for test in tests]
+
+
+def source_union(source: str, tests: list[str], store_dir: str = LINE_COV_DIR) -> int:
+    res = 0
+    for bits in source_bitmaps(source, tests, store_dir):
+        res |= bits
+    return res
+
+
+def source_intersection(source: str, tests: list[str], store_dir: str = LINE_COV_DIR) -> int:
+    bitmaps = source_bitmaps(source, tests, store_dir)
+    if len(bitmaps) == 0:
+        return 0
+    res = bitmaps[0]
+    for bits in bitmaps[1:]:
+        res &= bits
+    return res
+
+
+def runs_contain(text: str, line: int) -> bool:
+    for start, end in decode_runs(text):
+        if start <= line <= end:
+            return True
+    return False
+
+
+def tests_hitting(
+    source: str, line: int, store_dir: str = LINE_COV_DIR
+) -> list[str]:
+    """
+    which tests hit this line, the fault localization query
+    """
+    return sorted(
+        test for test, text in load_source(source, store_dir).items() if runs_contain(text, line)
+    )
+
+
+def print_cov(cov: dict[str, int]):
+    for source in sorted(cov.keys()):
+        print(f"{source}: {encode_runs(runs_from_bitmap(cov[source]))}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Query line level per-test coverage")
+    parser.add_argument("-s", "--store", default=LINE_COV_DIR, help="line coverage dir")
+    sub = parser.add_subparsers(dest="command", required=True)
+    hit = sub.add_parser("hit", help="tests hitting a source line")
+    hit.add_argument("source", help="source file, e.g. org/foo/Bar.java")
+    hit.add_argument("line", type=int)
+    union = sub.add_parser("union", help="lines covered by any of the tests")
+    union.add_argument("tests", nargs="+")
+    union.add_argument("--source", default="", help="only this source file")
+    intersect = sub.add_parser("intersect", help="lines covered by all of the tests")
+    intersect.add_argument("tests", nargs="+")
+    intersect.add_argument("--source", default="", help="only this source file")
+    sub.add_parser("reindex", help="rebuild the per-source files from the per-test files")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == "hit":
+        for test in tests_hitting(args.source, args.line, args.store):
+            print(test)
+    elif args.command == "reindex":
+        print(f"reindexed {reindex(args.store)} tests")
+    elif len(args.source) > 0:
+        if args.command == "union":
+            bits = source_union(args.source, args.tests, args.store)
+        else:
+            bits = source_intersection(args.source, args.tests, args.store)
+        print_cov({args.source: bits} if bits else {})
+    elif args.command == "union":
+        print_cov(union_cov(args.tests, args.store))
+    else:
+        print_cov(intersection_cov(args.tests, args.store))
+
+
+if __name__ == "__main__":
+    main()
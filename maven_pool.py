@@ -0,0 +1,89 @@
+"""
+warm maven workers for the per-test runs
+
+every `mvn` invocation starts a cold JVM, loads maven and resolves the project model again.
+the maven daemon (mvnd, https://github.com/apache/maven-mvnd) keeps long-lived JVMs with the project model
+and plugin class loaders cached and is driven by its client over a local socket.
+the per-test builds share the target/ directories and run one at a time, so a single warm daemon is enough.
+when mvnd is missing or a daemon dies mid build, the run is retried on the cold `mvn` path
+"""
+
+import logging
+import shutil
+import subprocess
+
+import metrics
+
+# after this many daemon deaths the pool gives up and every run goes the cold path
+MAX_WORKER_FAILURES = 3
+
+
+def cold_run(args: list[str], fields: dict | None = None) -> subprocess.CompletedProcess:
+    return metrics.run_child(args, fields)
+
+
+def worker_died(proc: subprocess.CompletedProcess) -> bool:
+    """
+    a failing test still ends with maven's build summary, a daemon that crashed or could not be reached does not
+    """
+    if proc.returncode == 0:
+        return False
+    output = proc.stdout + proc.stderr
+    return "BUILD FAILURE" not in output and "BUILD SUCCESS" not in output
+
+
+class MavenWorkerPool:
+    def __init__(self, executable: str = "mvnd"):
+        self.executable = shutil.which(executable)
+        self.healthy = self.executable is not None
+        self.failures = 0
+        if not self.healthy:
+            logging.warning(f"{executable} not found, maven runs use the cold path")
+
+    def to_worker_cmd(self, args: list[str]) -> list[str]:
+        assert self.executable is not None
+        assert args[0] == "mvn", f"not a maven command: {args}"
+        return [self.executable] + args[1:]
+
+    def warm_up(self, args: list[str] | None = None):
+        """
+        start the daemon and load the project model before the first test is submitted
+        """
+        if not self.healthy:
+            return
+        args = args or ["mvn", "-q", "validate", "-Drat.skip=true"]
+        subprocess.run(
+            self.to_worker_cmd(args), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+
+    def mark_failure(self, reason: str):
+        self.failures += 1
+        logging.warning(f"maven worker died ({reason}), falling back to the cold path")
+        if self.failures >= MAX_WORKER_FAILURES:
+            logging.error("too many maven worker failures, disabling the worker pool")
+            self.healthy = False
+
+    def run(self, args: list[str], fields: dict | None = None) -> subprocess.CompletedProcess:
+        """
+        run a `mvn ...` command on the warm daemon.
+        `fields` gets the peak rss of the child, only the mvnd client's on a warm worker
+        """
+        if not self.healthy:
+            return cold_run(args, fields)
+        try:
+            proc = metrics.run_child(self.to_worker_cmd(args), fields)
+        except OSError as e:
+            self.mark_failure(str(e))
+            return cold_run(args, fields)
+        if worker_died(proc):
+            self.mark_failure(f"exit code {proc.returncode}")
+            return cold_run(args, fields)
+        return proc
+
+    def stop(self):
+        """
+        mvnd has no per-client stop, this stops all daemons of the user (IDE, other projects)
+        """
+        if self.executable is not None:
+            logging.info("stopping the mvnd daemons")
+            subprocess.run([self.executable, "--stop"], capture_output=True)
@@ -0,0 +1,206 @@
+"""
+lightweight timing/metrics instrumentation shared by the pipeline scripts
+
+every phase appends one json line to METRICS_FILE:
+{"run", "script", "kind", "name", "ts", "seconds", "status", "peak_rss_kb", "child_peak_rss_kb", ...counts}
+set UTCOV_PROFILE=1 to additionally dump cProfile stats of the python hot paths into PROFILE_DIR
+"""
+
+import argparse
+import cProfile
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from config import LOG_DIR, METRICS_FILE, PROFILE_DIR
+from utils import prepare_dir
+
+run_id = f"{int(time.time())}-{os.getpid()}"
+script_name = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else ""
+profile_mode = os.environ.get("UTCOV_PROFILE", "") not in ("", "0")
+# only one profiler can be active at a time, blocks profiled concurrently on other threads are skipped
+profile_lock = threading.Lock()
+
+
+def peak_rss_kb() -> tuple[int, int]:
+    """
+    peak resident set size (KB on linux) of this process and of its largest waited child so far,
+    a running maximum over the process lifetime, see run_child for the peak of one child
+    """
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own, children
+
+
+def run_child(args: list[str], fields: dict | None = None) -> subprocess.CompletedProcess:
+    """
+    subprocess.run(args, text=True, capture_output=True), the child is reaped with wait4 so its own peak rss
+    (including its waited descendants, e.g. forked surefire jvms) is stored as fields["child_peak_rss_kb"]
+    """
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    assert proc.stdout is not None and proc.stderr is not None
+    stderr: list[str] = []
+    reader = threading.Thread(target=lambda: stderr.append(proc.stderr.read()))
+    reader.start()
+    stdout = proc.stdout.read()
+    reader.join()
+    proc.stdout.close()
+    proc.stderr.close()
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    if fields is not None:
+        fields["child_peak_rss_kb"] = usage.ru_maxrss
+    return subprocess.CompletedProcess(args, proc.returncode, stdout, stderr[0])
+
+
+def record(kind: str, name: str, **fields):
+    entry = {
+        "run": run_id,
+        "script": script_name,
+        "kind": kind,
+        "name": name,
+        "ts": time.time(),
+    }
+    entry.update(fields)
+    prepare_dir(LOG_DIR)
+    with open(METRICS_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+@contextmanager
+def phase(name: str, kind: str = "phase", **fields):
+    """
+    time a block and record it, the yielded dict can be filled with counts inside the block:
+
+    with metrics.phase("parse_call_log") as m:
+        m["lines"] = ...
+    """
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield fields
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        own, children = peak_rss_kb()
+        entry = {
+            "seconds": time.perf_counter() - start,
+            "status": status,
+            "peak_rss_kb": own,
+            "child_peak_rss_kb": children,
+        }
+        # a block measuring its own child (run_child) overrides the running maximum
+        entry.update(fields)
+        record(kind, name, **entry)
+
+
+def enable_profiling():
+    global profile_mode
+    profile_mode = True
+
+
+@contextmanager
+def profile(name: str):
+    """
+    cProfile the block when profiling is enabled, no-op otherwise
+    """
+    if not profile_mode or not profile_lock.acquire(blocking=False):
+        yield
+        return
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        profile_lock.release()
+        prepare_dir(PROFILE_DIR)
+        prof.dump_stats(
+            os.path.join(PROFILE_DIR, f"{name}-{run_id}-{time.time_ns()}.prof")
+        )
+
+
+def load_records(metrics_file: str) -> list[dict]:
+    records = []
+    if not os.path.exists(metrics_file):
+        return records
+    with open(metrics_file, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # a killed run may leave a partial last line
+                continue
+    return records
+
+
+def summarize(records: list[dict], top: int):
+    tests = [rec for rec in records if rec.get("kind") == "test"]
+    tests.sort(key=lambda rec: rec.get("seconds", 0.0), reverse=True)
+    print(f"slowest tests ({len(tests)} recorded):")
+    for rec in tests[:top]:
+        print(f"  {rec['seconds']:10.2f}s  {rec.get('status', '')}  {rec['name']}")
+
+    # aggregate phases by script and name
+    phases: dict[tuple[str, str], list[float]] = {}
+    for rec in records:
+        if rec.get("kind") != "phase":
+            continue
+        key = (rec.get("script", ""), rec["name"])
+        phases.setdefault(key, []).append(rec.get("seconds", 0.0))
+    rows = sorted(phases.items(), key=lambda item: sum(item[1]), reverse=True)
+    print(f"slowest phases ({len(rows)} distinct):")
+    print(f"  {'total':>10}  {'count':>6}  {'mean':>8}  {'max':>8}  phase")
+    for (script, name), secs in rows[:top]:
+        print(
+            f"  {sum(secs):10.2f}s {len(secs):6d}  {sum(secs) / len(secs):8.2f}  {max(secs):8.2f}  {script}:{name}"
+        )
+
+    peak = max((rec.get("peak_rss_kb", 0) for rec in records), default=0)
+    child_peak = max((rec.get("child_peak_rss_kb", 0) for rec in records), default=0)
+    print(f"peak rss: python {peak / 1024:.1f} MB, child processes {child_peak / 1024:.1f} MB")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Summarize pipeline metrics")
+    parser.add_argument("command", choices=["summary"], help="report to print")
+    parser.add_argument(
+        "-n", "--top", type=int, default=10, help="number of rows per table"
+    )
+    parser.add_argument(
+        "-r",
+        "--run",
+        default="",
+        help="restrict to a run id, `last` selects the most recent run per script",
+    )
+    parser.add_argument(
+        "-f", "--file", default=METRICS_FILE, help="metrics jsonl file to read"
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    records = load_records(args.file)
+    if args.run == "last":
+        last_runs: dict[str, str] = {}
+        for rec in records:
+            last_runs[rec.get("script", "")] = rec["run"]
+        runs = set(last_runs.values())
+        records = [rec for rec in records if rec["run"] in runs]
+    elif len(args.run) > 0:
+        records = [rec for rec in records if rec["run"] == args.run]
+    summarize(records, args.top)
+
+
+if __name__ == "__main__":
+    main()
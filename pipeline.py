@@ -0,0 +1,292 @@
+"""
+incremental runner chaining all pipeline stages
+
+    get_test_methods.py -> run_cov.py
+    gen_callgraph.py -> extract_callgraph.py
+
+each stage declares its inputs (glob patterns relative to the project root) and outputs.
+a stage is skipped when the stat fingerprint of its inputs matches the one recorded after its last successful run
+and all its outputs still exist. independent stages run concurrently, stages touching maven's target/ directories
+share the "target" lock since `mvn clean` in one would delete the jars another one reads.
+stages run as subprocesses, so the runner itself only imports the standard library and a no-op run stays fast
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+from config import (
+    BASE_DIR,
+    CALL_ENTRY_JSON,
+    CALL_ENTRY_KEY,
+    CALL_ENTRY_PICKLE,
+    CALL_LOG,
+    LOG_DIR,
+    TEST_METHODS_FILE,
+    UT_COV_DIR,
+)
+from utils import prepare_dir
+
+logging.basicConfig(level=logging.INFO, format="[%(levelname)s] - %(asctime)s - %(message)s")
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PIPELINE_STATE = os.path.join(LOG_DIR, "pipeline_state.json")
+# never descended into when fingerprinting inputs
+PRUNED_DIRS = {
+    ".git", ".idea", "node_modules", "scripts", "logs", "data", "ut_cov_data", "venv", "target"
+}
+
+
+@dataclass
+class Stage:
+    name: str
+    script: str
+    inputs: list[str]
+    outputs: list[str]
+    deps: list[str] = field(default_factory=list)
+    locks: set[str] = field(default_factory=set)
+    # caches of the script that must not survive a rerun
+    clean: list[str] = field(default_factory=list)
+
+
+def script_inputs(script: str) -> list[str]:
+    """
+    a stage also reruns when its script or config.py (filters, budgets) changes, scripts/ itself is never walked
+    """
+    return [os.path.join(SCRIPT_DIR, script), os.path.join(SCRIPT_DIR, "config.py")]
+
+
+def build_stages() -> list[Stage]:
+    # callgraph first: its javacg run is short, so call_entries extraction overlaps the long coverage stage.
+    # build outputs are never inputs: run_cov's `mvn clean` deletes the jars after every test
+    return [
+        Stage(
+            "callgraph",
+            "gen_callgraph.py",
+            inputs=["*pom.xml", "*/src/*.java"] + script_inputs("gen_callgraph.py"),
+            outputs=[CALL_LOG],
+            locks={"target"},
+        ),
+        Stage(
+            "test_methods",
+            "get_test_methods.py",
+            inputs=["*pom.xml", "*/src/test/*.java"] + script_inputs("get_test_methods.py"),
+            outputs=[TEST_METHODS_FILE],
+            locks={"target"},
+        ),
+        Stage(
+            "coverage",
+            "run_cov.py",
+            inputs=["*pom.xml", "*/src/*.java", TEST_METHODS_FILE] + script_inputs("run_cov.py"),
+            outputs=[os.path.join(UT_COV_DIR, "index.sqlite")],
+            deps=["test_methods"],
+            locks={"target"},
+        ),
+        Stage(
+            "call_entries",
+            "extract_callgraph.py",
+            inputs=[CALL_LOG] + script_inputs("extract_callgraph.py"),
+            outputs=[CALL_ENTRY_PICKLE, CALL_ENTRY_JSON],
+            deps=["callgraph"],
+            clean=[CALL_ENTRY_PICKLE, CALL_ENTRY_KEY, os.path.join(LOG_DIR, "unit_tests.json")],
+        ),
+    ]
+
+
+def iter_input_files(patterns: list[str]):
+    """
+    absolute patterns name single files, relative ones are matched against `./<path>` of every project file
+    """
+    rel_patterns = []
+    for pattern in patterns:
+        if os.path.isabs(pattern) or os.path.exists(pattern):
+            if os.path.isfile(pattern):
+                yield pattern
+        else:
+            rel_patterns.append(pattern)
+    if len(rel_patterns) == 0:
+        return
+    for dirpath, dirnames, filenames in os.walk(BASE_DIR):
+        dirnames[:] = [d for d in dirnames if d not in PRUNED_DIRS]
+        rel_dir = "." + dirpath[len(BASE_DIR) :]
+        for filename in filenames:
+            rel_path = os.path.join(rel_dir, filename)
+            if any(fnmatch.fnmatchcase(rel_path, pat) for pat in rel_patterns):
+                yield os.path.join(dirpath, filename)
+
+
+def fingerprint(patterns: list[str]) -> str:
+    entries = []
+    for path in iter_input_files(patterns):
+        st = os.stat(path)
+        entries.append(f"{os.path.normpath(path)}:{st.st_size}:{st.st_mtime_ns}")
+    entries.sort()
+    return hashlib.sha1("\n".join(entries).encode("utf-8")).hexdigest()
+
+
+def load_state() -> dict[str, dict]:
+    if not os.path.exists(PIPELINE_STATE):
+        return {}
+    with open(PIPELINE_STATE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state: dict[str, dict]):
+    prepare_dir(LOG_DIR)
+    with open(PIPELINE_STATE, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=4)
+
+
+def up_to_date(stage: Stage, state: dict[str, dict], input_fp: str, args: list[str]) -> bool:
+    prev = state.get(stage.name)
+    if prev is None or prev.get("inputs") != input_fp or prev.get("args", []) != args:
+        return False
+    return all(os.path.exists(path) for path in stage.outputs)
+
+
+def run_stage(stage: Stage, extra_args: list[str]) -> tuple[bool, float]:
+    for path in stage.clean:
+        if os.path.exists(path):
+            os.remove(path)
+    cmd = [sys.executable, os.path.join(SCRIPT_DIR, stage.script)] + extra_args
+    logging.info(f"[{stage.name}] running {' '.join(cmd)}")
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=BASE_DIR)
+    return proc.returncode == 0, time.perf_counter() - start
+
+
+def run_pipeline(
+    stages: list[Stage],
+    force: set[str],
+    dry_run: bool,
+    jobs: int,
+    stage_args: dict[str, list[str]],
+) -> bool:
+    state = load_state()
+    pending = {stage.name: stage for stage in stages}
+    done: set[str] = set()
+    failed: set[str] = set()
+    running: dict[Future, Stage] = {}
+    held_locks: set[str] = set()
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while len(pending) > 0 or len(running) > 0:
+            progress = False
+            for stage in list(pending.values()):
+                if any(dep in failed for dep in stage.deps):
+                    logging.error(f"[{stage.name}] skipped, a dependency failed")
+                    failed.add(stage.name)
+                    del pending[stage.name]
+                    progress = True
+                    continue
+                if not all(dep in done for dep in stage.deps):
+                    continue
+                if stage.locks & held_locks or len(running) >= jobs:
+                    continue
+                # upstream stages are finished, so their outputs are part of this fingerprint
+                input_fp = fingerprint(stage.inputs)
+                args = stage_args.get(stage.name, [])
+                if stage.name not in force and up_to_date(stage, state, input_fp, args):
+                    logging.info(f"[{stage.name}] up to date")
+                    done.add(stage.name)
+                    del pending[stage.name]
+                    progress = True
+                    continue
+                del pending[stage.name]
+                progress = True
+                if dry_run:
+                    logging.info(f"[{stage.name}] would run")
+                    done.add(stage.name)
+                    continue
+                held_locks |= stage.locks
+                future = pool.submit(run_stage, stage, args)
+                running[future] = stage
+
+            if progress:
+                continue
+            if len(running) == 0:
+                logging.error(f"unschedulable stages: {list(pending)}")
+                failed |= set(pending)
+                break
+            finished, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                held_locks -= stage.locks
+                ok, seconds = future.result()
+                if not ok:
+                    logging.error(f"[{stage.name}] failed after {seconds:.1f}s")
+                    failed.add(stage.name)
+                    continue
+                logging.info(f"[{stage.name}] finished in {seconds:.1f}s")
+                done.add(stage.name)
+                # fingerprint again, the stage may have produced its own inputs (mvn package building the jars)
+                state[stage.name] = {
+                    "inputs": fingerprint(stage.inputs),
+                    "args": stage_args.get(stage.name, []),
+                    "finished": time.time(),
+                }
+                save_state(state)
+    return len(failed) == 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the coverage and call graph pipeline")
+    parser.add_argument(
+        "stages", nargs="*", help="stages to run with their dependencies, default all"
+    )
+    parser.add_argument(
+        "-f", "--force", action="append", default=[], help="rerun a stage even if up to date"
+    )
+    parser.add_argument("-n", "--dry-run", action="store_true", help="only report what would run")
+    parser.add_argument("-j", "--jobs", type=int, default=2, help="stages run concurrently")
+    parser.add_argument(
+        "--cov-args", default="", help="extra arguments for run_cov.py, e.g. \"--delta\""
+    )
+    parser.add_argument(
+        "--extract-args",
+        default="",
+        help="extra arguments for extract_callgraph.py, e.g. \"-i org.foo.** --max-depth 20\"",
+    )
+    return parser.parse_args()
+
+
+def select_stages(stages: list[Stage], names: list[str]) -> list[Stage]:
+    if len(names) == 0:
+        return stages
+    by_name = {stage.name: stage for stage in stages}
+    selected: set[str] = set()
+    todo = list(names)
+    while len(todo) > 0:
+        name = todo.pop()
+        assert name in by_name, f"unknown stage {name}, choose from {list(by_name)}"
+        if name in selected:
+            continue
+        selected.add(name)
+        todo.extend(by_name[name].deps)
+    return [stage for stage in stages if stage.name in selected]
+
+
+def main() -> bool:
+    args = parse_args()
+    stages = select_stages(build_stages(), args.stages)
+    force = set(args.force)
+    if "all" in force:
+        force = {stage.name for stage in stages}
+    stage_args = {
+        "coverage": args.cov_args.split(),
+        "call_entries": args.extract_args.split(),
+    }
+    return run_pipeline(stages, force, args.dry_run, max(1, args.jobs), stage_args)
+
+
+if __name__ == "__main__":
+    if not main():
+        exit(1)
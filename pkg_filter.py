@@ -0,0 +1,77 @@
+"""
+package globs over dotted class names, compiled once into a trie
+
+a pattern is split on ".", each segment is either
+- a literal (`org`), looked up directly in the node's children
+- a glob (`*Test`, `Bar$*`), matched with fnmatch against one segment
+- `**`, matching any number (including zero) of segments
+e.g. `org.foo.**` (everything under org.foo), `**.generated.**`, `org.foo.shaded.**`, `org.foo.*Test`
+"""
+
+from fnmatch import fnmatchcase
+
+
+class TrieNode:
+    def __init__(self):
+        self.literals: dict[str, "TrieNode"] = {}
+        self.globs: dict[str, "TrieNode"] = {}
+        # node entered through `**`, reached without consuming a segment and consuming any segment itself
+        self.dstar: "TrieNode | None" = None
+        self.loops = False
+        self.terminal = False
+
+
+class PackageFilter:
+    def __init__(self, patterns: list[str]):
+        self.patterns = patterns
+        self.root = TrieNode()
+        for pattern in patterns:
+            self.add(pattern)
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def add(self, pattern: str):
+        node = self.root
+        for seg in pattern.split("."):
+            if seg == "**":
+                if node.dstar is None:
+                    node.dstar = TrieNode()
+                    node.dstar.loops = True
+                node = node.dstar
+            elif any(ch in seg for ch in "*?["):
+                node = node.globs.setdefault(seg, TrieNode())
+            else:
+                node = node.literals.setdefault(seg, TrieNode())
+        node.terminal = True
+
+    @staticmethod
+    def closure(nodes: list[TrieNode]) -> list[TrieNode]:
+        res = []
+        todo = list(nodes)
+        while len(todo) > 0:
+            node = todo.pop()
+            if node in res:
+                continue
+            res.append(node)
+            if node.dstar is not None:
+                todo.append(node.dstar)
+        return res
+
+    def matches(self, class_name: str) -> bool:
+        active = self.closure([self.root])
+        for seg in class_name.split("."):
+            nxt = []
+            for node in active:
+                if node.loops:
+                    nxt.append(node)
+                child = node.literals.get(seg)
+                if child is not None:
+                    nxt.append(child)
+                for pat, child in node.globs.items():
+                    if fnmatchcase(seg, pat):
+                        nxt.append(child)
+            if len(nxt) == 0:
+                return False
+            active = self.closure(nxt)
+        return any(node.terminal for node in active)
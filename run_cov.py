@@ -6,28 +6,43 @@ import argparse
 import json
 import logging
 import os
+import queue
 import re
+import shutil
 import subprocess
 import sys
+import threading
 import xml.etree.ElementTree as ET
 from dataclasses import dataclass
 
 import colorlog
 
+import cov_index
+import cov_store
+import line_cov
+import maven_pool
+import metrics
+from config import UT_COV_DIR
+
 JACOCO_FILE = "target/site/jacoco/jacoco.xml"
 METRIC = "INSTRUCTION"
 PKG_PREFIX = "org.apache.shiro"
-UT_COV_DIR = "ut_cov_data"
 BASE_DIR = os.path.join(sys.path[0], "..")
 DATA_DIR = "data"
+SNAPSHOT_DIR = "report_snapshots"
 
 debug = False
 try_mode = False
 multi_module_mode = False
+delta_mode = False
+post_workers = 2
+post_queue_size = 4
 
 sub_projects: list[str] = []
 pom_modules: list[str] = []
 test_methods: list[str] = []
+cov_idx: cov_index.CovIndex | None = None
+worker_pool: maven_pool.MavenWorkerPool | None = None
 
 # Create a logger
 logger = colorlog.getLogger()
@@ -74,6 +89,13 @@ class CovRecord:
     def toJSON(self):
         return json.dumps(self, default=lambda o: o.__dict__, sort_keys=True, indent=4)
 
+    def toDict(self) -> dict:
+        # same shape as toJSON, without the recursive copying of dataclasses.asdict
+        return {
+            "loc": dict(self.loc.__dict__),
+            "cov": {metric: dict(res.__dict__) for metric, res in self.cov.items()},
+        }
+
 
 def prepare_subprojects():
     cmd = 'mvn -q --also-make exec:exec -Dexec.executable="pwd" -Dmaven.clean.failOnError=false'
@@ -111,9 +133,12 @@ def collect_test_methods() -> list[str]:
     return test_methods
 
 
-def extract_cov_report(file_path: str) -> list[CovRecord]:
+def extract_cov_report(
+    file_path: str, covered_lines: dict[str, list[int]] | None = None
+) -> list[CovRecord]:
     """
     filter the non-hit method, collect hitted flatten record
+    if covered_lines is given, it is filled in the same pass with the covered line numbers of each source file
     """
     tree = ET.parse(file_path)
     root = tree.getroot()
@@ -123,6 +148,14 @@ def extract_cov_report(file_path: str) -> list[CovRecord]:
         if package.tag != "package":
             continue
         for classes in package:
+            if classes.tag == "sourcefile" and covered_lines is not None:
+                source = package.attrib.get("name", "") + "/" + classes.attrib.get("name", "")
+                covered_lines[source] = [
+                    int(line.attrib["nr"])
+                    for line in classes
+                    if line.tag == "line" and line.attrib.get("ci", "0") != "0"
+                ]
+                continue
             if classes.tag != "class":
                 continue
             for method in classes:
@@ -218,10 +251,12 @@ def run_ut(test_method: str, full_path: str, sub: bool) -> bool:
 
     logger.info(f"command: {cmd}")
 
-    if debug or try_mode:
-        proc = subprocess.run(cmd.split(), text=True, capture_output=True)
-    else:
-        proc = subprocess.run(cmd.split(), text=True, capture_output=True)
+    with metrics.phase("maven", test=test_method, sub=sub) as m:
+        if worker_pool is not None:
+            proc = worker_pool.run(cmd.split(), m)
+        else:
+            proc = metrics.run_child(cmd.split(), m)
+        m["returncode"] = proc.returncode
     ret = proc.returncode
     if debug:
         debug_log = os.path.join(DATA_DIR, "run_ut.log")
@@ -327,55 +362,147 @@ def get_report(test_method: str, sub: bool) -> str:
     """
     global sub_projects
     loc = extract_method_name(test_method)
-    full_path = get_full_path(loc)
+    with metrics.phase("get_full_path"):
+        full_path = get_full_path(loc)
     flag = run_ut(test_method, full_path, sub)
     if not flag:
         return ""
-    report_path = search_for_report_path(loc, full_path)
+    with metrics.phase("search_report_path"):
+        report_path = search_for_report_path(loc, full_path)
     return report_path
 
 
+def get_cov_index() -> cov_index.CovIndex:
+    global cov_idx
+    if cov_idx is None:
+        cov_idx = cov_index.CovIndex(cov_index.COV_INDEX_DB, METRIC)
+    return cov_idx
+
+
 def persist_cov_data(test_method: str, cov_records: list[CovRecord]):
+    """
+    identical coverage vectors are stored once, see cov_store
+    """
     if not os.path.exists(UT_COV_DIR):
-        os.mkdir(UT_COV_DIR)
-    file_path = os.path.join(UT_COV_DIR, test_method + ".json")
+        os.makedirs(UT_COV_DIR, exist_ok=True)
     if debug:
         __import__("ipdb").set_trace()
-    json_str = "["
-    for ind, cov_rec in enumerate(cov_records):
-        if ind > 0:
-            json_str += ",\n"
-        json_str += cov_rec.toJSON()
-    json_str += "\n]"
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write(json_str)
+    records = [cov_rec.toDict() for cov_rec in cov_records]
+    with metrics.phase("write_cov_json") as m:
+        m["bytes"] = cov_store.persist(test_method, records, UT_COV_DIR, delta_mode)
+    with metrics.phase("index_cov"):
+        get_cov_index().add(test_method, records)
 
 
-def run_and_collect_cov(test_method: str) -> bool:
+def run_and_report(test_method: str) -> str:
     """
-    run and then collect data(path needed)
-    returns whether succeed
+    run the maven build of a test, returns the path of its jacoco report or "" on failure
     """
     global sub_projects, multi_module_mode
     if multi_module_mode:
         report_path = get_report(test_method, True)
         if len(report_path) == 0:
             report_path = get_report(test_method, False)
-            if len(report_path) == 0:
-                return False
     else:
         report_path = get_report(test_method, False)
-        if len(report_path) == 0:
-            return False
+    return report_path
 
-    cov_records = extract_cov_report(report_path)
+
+def collect_cov(test_method: str, report_path: str) -> bool:
+    """
+    parse a jacoco report and persist its coverage
+    """
+    with metrics.profile("extract_cov_report"), metrics.phase(
+        "extract_cov_report"
+    ) as m:
+        covered_lines: dict[str, list[int]] = {}
+        cov_records = extract_cov_report(report_path, covered_lines)
+        m["records"] = len(cov_records)
     logger.info(f"cov_record sample: {cov_records[0]}")
-    rate = calculate_coverage(cov_records, METRIC)
-    logger.info(f"{METRIC} coverage rate: {rate:.2f}")
-    persist_cov_data(test_method, cov_records)
+    with metrics.phase("calculate_coverage"):
+        rate = calculate_coverage(cov_records, METRIC)
+    logger.info(f"{test_method} {METRIC} coverage rate: {rate:.2f}")
+    with metrics.profile("persist_cov_data"), metrics.phase("persist_cov_data"):
+        persist_cov_data(test_method, cov_records)
+    with metrics.phase("persist_line_cov") as m:
+        m["bytes"] = line_cov.persist(test_method, covered_lines, line_cov.LINE_COV_DIR)
     return True
 
 
+def run_and_collect_cov(test_method: str) -> bool:
+    """
+    run and then collect data(path needed)
+    returns whether succeed
+    """
+    report_path = run_and_report(test_method)
+    if len(report_path) == 0:
+        return False
+    return collect_cov(test_method, report_path)
+
+
+def snapshot_report(test_method: str, report_path: str) -> str:
+    """
+    move the report out of target/ before the next test's `mvn clean` removes it
+    """
+    snapshot_dir = os.path.join(BASE_DIR, DATA_DIR, SNAPSHOT_DIR)
+    if not os.path.exists(snapshot_dir):
+        os.makedirs(snapshot_dir, exist_ok=True)
+    snapshot = os.path.join(snapshot_dir, test_method + ".xml")
+    shutil.move(report_path, snapshot)
+    return snapshot
+
+
+class PostProcessor:
+    """
+    background parser/writer pool: the main thread keeps running maven builds while
+    finished reports are parsed and persisted, submit() blocks when `queue_size` reports are waiting
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.tasks: queue.Queue[tuple[str, str] | None] = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.succeeded = 0
+        self.failed = 0
+        # open the shared index before the workers race for it
+        get_cov_index()
+        self.threads = [
+            threading.Thread(target=self.work, name=f"post-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, test_method: str, report_path: str):
+        with metrics.phase("post_queue_wait") as m:
+            self.tasks.put((test_method, report_path))
+            m["queued"] = self.tasks.qsize()
+
+    def work(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                return
+            test_method, report_path = task
+            try:
+                flag = collect_cov(test_method, report_path)
+                os.remove(report_path)
+            except Exception as e:
+                logger.error(f"failed to collect coverage of {test_method}: {e!r}")
+                logger.error(f"report kept at {report_path}")
+                flag = False
+            with self.lock:
+                if flag:
+                    self.succeeded += 1
+                else:
+                    self.failed += 1
+
+    def close(self):
+        for _ in self.threads:
+            self.tasks.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
 def prepare_dir(dir: str):
     if not os.path.exists(dir):
         os.mkdir(dir)
@@ -391,6 +518,9 @@ def main():
     test_methods = collect_test_methods()
     sub_projects = collect_subprojects()
     pom_modules = collect_modules()
+    if worker_pool is not None:
+        with metrics.phase("warm_up_workers"):
+            worker_pool.warm_up()
 
     if debug:
         __import__("ipdb").set_trace()
@@ -406,22 +536,57 @@ def main():
             logging.error("failed to collect testing UT")
         else:
             logging.info("test running succeeded")
+    elif debug or post_workers == 0:
+        run_sequentially()
     else:
-        succ = 0
-        for ind, test_method in enumerate(test_methods):
-            logger.info(f"running testmethod {ind+1}: {test_method}")
+        run_pipelined()
+
+
+def run_sequentially():
+    succ = 0
+    for ind, test_method in enumerate(test_methods):
+        logger.info(f"running testmethod {ind+1}: {test_method}")
+        with metrics.phase(test_method, kind="test") as m:
             flag = run_and_collect_cov(
                 test_method,
             )
-            if not flag:
+            m["success"] = flag
+        if not flag:
+            logger.warning(f"running {ind+1} failed")
+        else:
+            succ += 1
+            logger.info(f"running {ind + 1} succeeded, succeeded: {succ}/{ind+1}")
+        print()
+        if debug:
+            break
+    logger.info(f"success totally: {succ}/{len(test_methods)}")
+
+
+def run_pipelined():
+    """
+    maven runs back to back in this thread, report parsing and persistence overlap with the next run
+    """
+    post = PostProcessor(post_workers, post_queue_size)
+    built = 0
+    try:
+        for ind, test_method in enumerate(test_methods):
+            logger.info(f"running testmethod {ind+1}: {test_method}")
+            with metrics.phase(test_method, kind="test") as m:
+                report_path = run_and_report(test_method)
+                m["success"] = len(report_path) > 0
+            if len(report_path) == 0:
                 logger.warning(f"running {ind+1} failed")
             else:
-                succ += 1
-                logger.info(f"running {ind + 1} succeeded, succeeded: {succ}/{ind+1}")
+                built += 1
+                logger.info(f"running {ind + 1} succeeded, succeeded: {built}/{ind+1}")
+                post.submit(test_method, snapshot_report(test_method, report_path))
             print()
-            if debug:
-                break
-        logger.info(f"success totally: {succ}/{len(test_methods)}")
+    finally:
+        # the workers are daemon threads, reports still queued must be persisted before exiting
+        if post.tasks.qsize() > 0:
+            logger.info(f"finishing {post.tasks.qsize()} queued reports")
+        post.close()
+    logger.info(f"success totally: {post.succeeded}/{len(test_methods)}")
 
 
 if __name__ == "__main__":
@@ -432,8 +597,58 @@ if __name__ == "__main__":
     parser.add_argument(
         "-t", "--try", help="try sample execution", action="store_true", dest="try_mode"
     )
+    parser.add_argument(
+        "-p",
+        "--profile",
+        help="dump cProfile stats of report parsing and persistence",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-w",
+        "--warm",
+        help="run maven on warm mvnd workers, falls back to mvn if unavailable",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--stop-workers",
+        help="run `mvnd --stop` at exit, this stops every mvnd daemon of the user, not only this run's",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-j",
+        "--post-workers",
+        type=int,
+        default=2,
+        help="report parsing/persisting threads overlapping the next maven run, 0 runs everything sequentially",
+    )
+    parser.add_argument(
+        "-q",
+        "--queue-size",
+        type=int,
+        default=4,
+        help="reports waiting for post-processing before maven runs are held back",
+    )
+    parser.add_argument(
+        "--delta",
+        help="store near-identical coverage as a delta against the test class baseline",
+        action="store_true",
+    )
     args = parser.parse_args()
 
     debug = args.debug
     try_mode = args.try_mode
-    main()
+    delta_mode = args.delta
+    post_workers = args.post_workers
+    post_queue_size = max(1, args.queue_size)
+    if args.warm:
+        worker_pool = maven_pool.MavenWorkerPool()
+    if args.profile:
+        metrics.enable_profiling()
+    try:
+        main()
+    finally:
+        if worker_pool is not None:
+            if args.stop_workers:
+                worker_pool.stop()
+            else:
+                logger.info("mvnd daemons kept running, stop them with `mvnd --stop`")
@@ -1,6 +1,42 @@
+import gzip
 import os
 
 
 def prepare_dir(dir_path: str):
     if not os.path.exists(dir_path):
         os.makedirs(dir_path)
+
+
+def open_text(file_path: str, mode: str = "r"):
+    """
+    open a text file, transparently (de)compressing `.gz` paths
+    """
+    if file_path.endswith(".gz"):
+        return gzip.open(file_path, mode + "t", encoding="utf-8", compresslevel=1)
+    return open(file_path, mode, encoding="utf-8")
+
+
+def to_bitset(ids: list[int]) -> int:
+    """
+    int bitset with bit n set for every id n
+    """
+    if len(ids) == 0:
+        return 0
+    bitmap = bytearray(max(ids) // 8 + 1)
+    for ind in ids:
+        bitmap[ind >> 3] |= 1 << (ind & 7)
+    return int.from_bytes(bitmap, "little")
+
+
+def bits_of(bits: int) -> list[int]:
+    """
+    the set bit positions of an int bitset, ascending
+    """
+    res = []
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for byte_ind, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            res.append(byte_ind * 8 + low.bit_length() - 1)
+            byte ^= low
+    return res